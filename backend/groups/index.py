@@ -4,18 +4,710 @@ Args: event с httpMethod, queryStringParameters, body; context с request_id
 Returns: HTTP response с данными групп
 '''
 
+import base64
+import gzip
+import hashlib
+import hmac
+import importlib
+import io
 import json
 import os
-from typing import Dict, Any, List
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from json.encoder import encode_basestring
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, Json, execute_values
+
+# requests нужен только ветке аналитики: импортируется при первом запросе к внешним API
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Инфраструктура (трассировка, пул и реплики, prepared statements, HTTP-кэш,
+# потоковый JSON, сжатие, handler) одинакова в backend/groups/index.py и
+# backend/reviews/index.py: каждая папка backend/<name> деплоится отдельной
+# функцией, и общий модуль вне неё в функцию не попадёт. Правка вносится в оба
+# файла; python bench/check_shared.py падает, если определения разошлись
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', '').lower() in ('1', 'true')
+TRACE_HEADER_MAX_SPANS = 30
+
+class RequestTrace:
+    '''
+    Спаны одного запроса: подключение к БД, SQL, внешние вызовы, кодирование JSON.
+    Включается TRACE_ENABLED; выключенная трассировка не подменяет курсоры
+    '''
+
+    def __init__(self, request_id: Optional[str]):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, detail: str = '') -> None:
+        finished = time.perf_counter()
+        with self._lock:
+            self.spans.append((name, started - self.started, finished - started, detail))
+
+    def server_timing(self) -> str:
+        entries = []
+        for name, _, duration, detail in self.spans[:TRACE_HEADER_MAX_SPANS]:
+            entry = f'{name};dur={duration * 1000:.2f}'
+            if detail:
+                desc = ' '.join(detail.split())[:60].replace('"', "'").replace('\\', '/')
+                desc = desc.encode('ascii', 'replace').decode()
+                entry += f';desc="{desc}"'
+            entries.append(entry)
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries)
+
+    def log(self, event: Dict[str, Any], status: int) -> None:
+        print(json.dumps({
+            'request_id': self.request_id,
+            'method': event.get('httpMethod'),
+            'params': event.get('queryStringParameters') or {},
+            'status': status,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'spans': [
+                {'name': name, 'start_ms': round(start * 1000, 2),
+                 'duration_ms': round(duration * 1000, 2), 'detail': detail}
+                for name, start, duration, detail in self.spans
+            ]
+        }, ensure_ascii=False), flush=True)
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('current_trace', default=None)
+
+@contextmanager
+def trace_span(name: str, detail: str = '') -> Iterator[None]:
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, started, detail)
+
+def normalize_sql(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())
+
+class TracingDictCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        with trace_span('sql', normalize_sql(query)):
+            return super().execute(query, vars)
+
+class TracingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        with trace_span('sql', normalize_sql(query)):
+            return super().execute(query, vars)
+
+    def fetchmany(self, size=None):
+        with trace_span('sql-fetch'):
+            return super().fetchmany(size)
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() in ('1', 'true')
+
+class PreparingConnection(psycopg2.extensions.connection):
+    # Имена запросов, уже подготовленных в сессии: PREPARE живёт до закрытия соединения
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: set = set()
+        self.prepared_stale = False
+
+SQL_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+
+_prepared_queries: Dict[str, Tuple[str, str, str]] = {}
+
+def prepare_query(query: str) -> Tuple[str, str, str]:
+    '''
+    Переводит запрос с плейсхолдерами psycopg2 (%s или %(name)s) в текст для
+    PREPARE с $1, $2, ... и строку EXECUTE с теми же плейсхолдерами.
+    Имя выводится из текста запроса, результат кешируется на процесс.
+    '''
+    cached = _prepared_queries.get(query)
+    if cached:
+        return cached
+    names: List[str] = []
+    positional = 0
+    
+    def replace(match) -> str:
+        nonlocal positional
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1):
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f'${names.index(match.group(1)) + 1}'
+        positional += 1
+        return f'${positional}'
+    
+    statement = SQL_PLACEHOLDER.sub(replace, query)
+    placeholders = [f'%({name})s' for name in names] or ['%s'] * positional
+    name = 'q_' + hashlib.md5(query.encode()).hexdigest()[:16]
+    execute = f"EXECUTE {name} ({', '.join(placeholders)})" if placeholders else f'EXECUTE {name}'
+    cached = _prepared_queries[query] = (name, statement, execute)
+    return cached
+
+def execute_prepared(cur, query: str, args: Any = None) -> None:
+    '''
+    Выполняет фиксированный запрос через серверный prepared statement: на тёплом
+    соединении Postgres не разбирает и не планирует его заново. Без PreparingConnection
+    или с DB_PREPARED_STATEMENTS=false (PgBouncer в transaction mode) - обычный execute.
+    '''
+    prepared = getattr(cur.connection, 'prepared_statements', None)
+    if not DB_PREPARED_STATEMENTS or prepared is None:
+        cur.execute(query, args)
+        return
+    conn = cur.connection
+    if conn.prepared_stale:
+        cur.execute('DEALLOCATE ALL')
+        prepared.clear()
+        conn.prepared_stale = False
+    name, statement, execute = prepare_query(query)
+    if name not in prepared:
+        cur.execute(f'PREPARE {name} AS {statement}')
+        prepared.add(name)
+    try:
+        cur.execute(execute, args)
+    except psycopg2.Error as e:
+        # После миграции план с другим набором колонок не выполняется (0A000):
+        # запросы сессии подготавливаются заново при следующем обращении
+        if e.pgcode == '0A000':
+            conn.prepared_stale = True
+        raise
+
+class PoolExhaustedError(psycopg2.OperationalError):
+    pass
+
+class ConnectionPool:
+    '''
+    Пул соединений уровня модуля: переживает вызовы в тёплом контейнере,
+    проверяет соединение при выдаче и закрывает простаивающие дольше idle_timeout
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.stats = {'connects': 0, 'reuses': 0, 'discarded': 0, 'evicted': 0}
+
+    def acquire(self, blocking: bool = True):
+        acquired = self._slots.acquire(timeout=DB_POOL_TIMEOUT) if blocking else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolExhaustedError('Connection pool exhausted')
+        try:
+            while True:
+                with self._lock:
+                    self._evict_idle(time.monotonic())
+                    if not self._idle:
+                        break
+                    conn, last_used = self._idle.pop()
+                if self._is_healthy(conn, time.monotonic() - last_used):
+                    self._count('reuses')
+                    return conn
+                self._close(conn)
+                self._count('discarded')
+            conn = psycopg2.connect(
+                self.dsn,
+                connection_factory=PreparingConnection,
+                cursor_factory=TracingDictCursor if TRACE_ENABLED else RealDictCursor
+            )
+            self._count('connects')
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        try:
+            if conn.closed:
+                return
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._close(conn)
+                self._count('discarded')
+                return
+            with self._lock:
+                now = time.monotonic()
+                self._evict_idle(now)
+                self._idle.append((conn, now))
+        finally:
+            self._slots.release()
+
+    def stats_header(self) -> str:
+        total = self.stats['connects'] + self.stats['reuses']
+        hit_rate = self.stats['reuses'] / total if total else 0
+        return (f"connects={self.stats['connects']}, reuses={self.stats['reuses']}, "
+                f"discarded={self.stats['discarded']}, evicted={self.stats['evicted']}, "
+                f"hit_rate={hit_rate:.2f}")
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if idle_for < DB_POOL_HEALTHCHECK_AFTER:
+            return True
+        try:
+            with conn.cursor() as check:
+                check.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict_idle(self, now: float) -> None:
+        fresh = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                self._close(conn)
+                self.stats['evicted'] += 1
+            else:
+                fresh.append((conn, last_used))
+        self._idle = fresh
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+_db_pool: Optional[ConnectionPool] = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool() -> ConnectionPool:
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT
+                )
+    return _db_pool
+
+DATABASE_REPLICA_URLS = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', '5'))
+
+class ReplicaSet:
+    '''
+    Реплики для чтения с round-robin. Отставание проверяется при выдаче соединения
+    не чаще раза в REPLICA_CHECK_INTERVAL; реплика с ошибкой или отставанием больше
+    REPLICA_MAX_LAG пропускается до следующей проверки. read_after - LSN последней
+    записи клиента: реплика, которая его ещё не доиграла, тоже пропускается.
+    '''
+
+    def __init__(self, dsns: List[str]):
+        self.pools = [ConnectionPool(dsn, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT) for dsn in dsns]
+        self._checked_at = [0.0] * len(dsns)
+        self._usable = [True] * len(dsns)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, read_after: Optional[str]) -> Optional[Tuple[Any, ConnectionPool]]:
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            check_due = time.monotonic() - self._checked_at[index] >= REPLICA_CHECK_INTERVAL
+            if not self._usable[index] and not check_due:
+                continue
+            pool = self.pools[index]
+            try:
+                conn = pool.acquire(blocking=False)
+            except PoolExhaustedError:
+                # Все соединения реплики заняты - это не сбой: она остаётся в ротации,
+                # а запрос без ожидания слота идёт на следующую реплику или на primary
+                continue
+            except psycopg2.Error:
+                self._mark(index, False)
+                continue
+            try:
+                if check_due:
+                    self._mark(index, self._lag(conn) <= REPLICA_MAX_LAG)
+                if self._usable[index] and (not read_after or self._has_replayed(conn, read_after)):
+                    return conn, pool
+            except psycopg2.Error:
+                self._mark(index, False)
+            pool.release(conn)
+        return None
+
+    def _mark(self, index: int, usable: bool) -> None:
+        with self._lock:
+            self._usable[index] = usable
+            self._checked_at[index] = time.monotonic()
+
+    def _lag(self, conn) -> float:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT COALESCE(CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                END, 0) as lag
+            ''')
+            return float(cur.fetchone()['lag'])
+
+    def _has_replayed(self, conn, lsn: str) -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                'SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, TRUE) as replayed',
+                (lsn,)
+            )
+            return cur.fetchone()['replayed']
+
+_replica_set: Optional[ReplicaSet] = None
+_connection_pools: Dict[int, ConnectionPool] = {}
+
+def get_replica_set() -> Optional[ReplicaSet]:
+    global _replica_set
+    if _replica_set is None and DATABASE_REPLICA_URLS:
+        with _db_pool_lock:
+            if _replica_set is None:
+                _replica_set = ReplicaSet(DATABASE_REPLICA_URLS)
+    return _replica_set
+
+def parse_lsn(value: Optional[str]) -> Optional[str]:
+    high, _, low = (value or '').partition('/')
+    try:
+        int(high, 16)
+        int(low, 16)
+    except ValueError:
+        return None
+    return value
+
+def get_read_connection(read_after: Optional[str] = None):
+    '''
+    Соединение для GET: с реплики, если они настроены и успевают, иначе с primary
+    '''
+    replicas = get_replica_set()
+    if replicas is not None:
+        with trace_span('db-acquire', 'replica'):
+            acquired = replicas.acquire(parse_lsn(read_after))
+        if acquired is not None:
+            conn, pool = acquired
+            with _db_pool_lock:
+                _connection_pools[id(conn)] = pool
+            return conn
+    return get_db_connection()
+
+def read_after_headers(cur) -> Dict[str, str]:
+    '''
+    LSN primary после записи: клиент передаёт его в ?read_after=,
+    и следующие чтения не уходят на реплику, которая записи ещё не видит
+    '''
+    if not DATABASE_REPLICA_URLS:
+        return {}
+    cur.execute('SELECT pg_current_wal_lsn()::text as lsn')
+    return {'X-Read-After': cur.fetchone()['lsn']}
 
 def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    with trace_span('db-acquire'):
+        return get_db_pool().acquire()
+
+def release_db_connection(conn) -> None:
+    with _db_pool_lock:
+        pool = _connection_pools.pop(id(conn), None)
+    (pool or get_db_pool()).release(conn)
+
+@contextmanager
+def db_cursor() -> Iterator[Any]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', '0'))
+LAST_MODIFIED_SETTLE = timedelta(seconds=2)
+
+def get_header(event: Dict[str, Any], name: str) -> str:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value or ''
+    return ''
+
+def get_resource_version(cur, resource: str) -> Tuple[str, Optional[datetime]]:
+    execute_prepared(cur, 'SELECT version, updated_at FROM cache_versions WHERE resource = %s', (resource,))
+    row = cur.fetchone()
+    if not row:
+        return f'W/"{resource}-0"', None
+    return f'W/"{resource}-{row["version"]}"', http_last_modified(row['updated_at'])
+
+def http_last_modified(updated_at: datetime) -> Optional[datetime]:
+    '''
+    Last-Modified с точностью до секунды. Пока секунда последней записи не
+    закончилась (с запасом LAST_MODIFIED_SETTLE на расхождение часов), заголовок
+    не отдаётся: запись в ту же секунду его бы не изменила, и If-Modified-Since
+    дал бы ложный 304. В это время клиент сверяется только по ETag.
+    '''
+    updated_at = updated_at.astimezone(timezone.utc)
+    if datetime.now(timezone.utc) - updated_at < LAST_MODIFIED_SETTLE:
+        return None
+    return updated_at.replace(microsecond=0)
+
+def bump_resource_versions(cur, *resources: str) -> None:
+    cur.execute(
+        '''UPDATE cache_versions
+           SET version = version + 1, updated_at = clock_timestamp()
+           WHERE resource = ANY(%s)''',
+        (sorted(resources),)
+    )
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    # Vary одинаковый у 200 и 304: кэш не сопоставит 304 с телом в другой кодировке
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate',
+        'Vary': 'Accept-Encoding'
+    }
+    if last_modified:
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+def is_not_modified(event: Dict[str, Any], etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in candidates]
+    
+    if_modified_since = get_header(event, 'If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            **cache_headers(etag, last_modified)
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '2000'))
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps_json(payload: Any) -> str:
+    with trace_span('encode'):
+        if orjson is not None:
+            return orjson.dumps(payload, default=json_default).decode()
+        return json.dumps(payload, default=json_default, ensure_ascii=False)
+
+def encode_json_value(value: Any) -> str:
+    value_type = type(value)
+    if value is None:
+        return 'null'
+    if value_type is str:
+        return encode_basestring(value)
+    if value_type is bool:
+        return 'true' if value else 'false'
+    if value_type is int:
+        return int.__repr__(value)
+    if value_type is float or value_type is Decimal:
+        return repr(float(value))
+    if value_type is datetime or value_type is date:
+        return '"' + value.isoformat() + '"'
+    return dumps_json(value)
+
+def stream_query_json(conn, query: str, args: Any = None) -> str:
+    '''
+    Выполняет запрос серверным (именованным) курсором и кодирует строки
+    кортежами порциями по STREAM_CHUNK_SIZE: ключи колонок готовятся один раз,
+    в памяти одновременно лежит только одна порция строк и растущий JSON
+    '''
+    started = time.perf_counter()
+    buffer = io.StringIO()
+    buffer.write('[')
+    cursor_factory = TracingCursor if TRACE_ENABLED else psycopg2.extensions.cursor
+    with conn.cursor(name='stream_rows', cursor_factory=cursor_factory) as cur:
+        cur.itersize = STREAM_CHUNK_SIZE
+        cur.execute(query, args)
+        keys: Optional[List[str]] = None
+        separator = ''
+        while True:
+            rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            if keys is None:
+                keys = [column.name for column in cur.description]
+                prefixes = ['{' + encode_basestring(keys[0]) + ':'] + [
+                    ',' + encode_basestring(key) + ':' for key in keys[1:]
+                ]
+            if orjson is not None:
+                chunk = orjson.dumps([dict(zip(keys, row)) for row in rows], default=json_default).decode()
+                buffer.write(separator + chunk[1:-1])
+            else:
+                for row in rows:
+                    buffer.write(separator)
+                    buffer.write(''.join(prefix + encode_json_value(value) for prefix, value in zip(prefixes, row)))
+                    buffer.write('}')
+                    separator = ','
+            separator = ','
+    buffer.write(']')
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add('stream', started)
+    return buffer.getvalue()
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', '3'))
+COMPRESSION_MODULES = {'br': 'brotli', 'zstd': 'zstandard'}
+
+_compressors: Dict[str, Any] = {}
+
+def load_compressor(encoding: str) -> Any:
+    # Модуль сжатия импортируется при первом большом ответе, а не на холодном старте
+    if encoding not in _compressors:
+        try:
+            _compressors[encoding] = importlib.import_module(COMPRESSION_MODULES[encoding])
+        except ImportError:
+            _compressors[encoding] = None
+    return _compressors[encoding]
+
+def available_encodings() -> List[str]:
+    # Порядок - предпочтение сервера при равных q у клиента
+    encodings = [encoding for encoding in ('br', 'zstd') if load_compressor(encoding) is not None]
+    encodings.append('gzip')
+    return encodings
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, options = part.partition(';')
+        quality = 1.0
+        options = options.strip()
+        if options.startswith('q='):
+            try:
+                quality = float(options[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    
+    best: Optional[Tuple[str, float]] = None
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+def compress_body(raw: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return load_compressor('br').compress(raw, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return load_compressor('zstd').ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Сжимает тело ответа по Accept-Encoding клиента: brotli или zstd, если
+    модули установлены, иначе gzip. Тела меньше COMPRESSION_MIN_SIZE байт
+    отдаются как есть. Сжатое тело возвращается в base64 с isBase64Encoded.
+    '''
+    body = response.get('body')
+    headers = response.setdefault('headers', {})
+    if response.get('isBase64Encoded') or not isinstance(body, str) or 'Content-Encoding' in headers:
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_SIZE:
+        return response
+    
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = negotiate_encoding(get_header(event, 'Accept-Encoding'))
+    if encoding is None:
+        return response
+    with trace_span('compress', encoding):
+        compressed = compress_body(raw, encoding)
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    headers['Content-Encoding'] = encoding
+    return response
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def is_admin_request(event: Dict[str, Any]) -> bool:
+    '''
+    Служебные POST-маршруты вызывает планировщик с заголовком X-Admin-Token.
+    Пока ADMIN_TOKEN не задан в окружении, они закрыты для всех.
+    '''
+    token = get_header(event, 'X-Admin-Token')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def forbidden_response() -> Dict[str, Any]:
+    return {
+        'statusCode': 403,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': 'Admin token required'}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    trace = RequestTrace(getattr(context, 'request_id', None)) if TRACE_ENABLED else None
+    token = _current_trace.set(trace)
+    try:
+        response = compress_response(event, handle_request(event, context))
+    finally:
+        _current_trace.reset(token)
+    headers = response.setdefault('headers', {})
+    if _db_pool is not None:
+        headers['X-DB-Pool'] = _db_pool.stats_header()
+    if trace is not None:
+        headers['Server-Timing'] = trace.server_timing()
+        trace.log(event, response.get('statusCode', 0))
+    exposed = [name for name in ('X-DB-Pool', 'Server-Timing', 'X-Read-After') if name in headers]
+    if exposed:
+        headers['Access-Control-Expose-Headers'] = ', '.join(exposed)
+    return response
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     params = event.get('queryStringParameters') or {}
     
@@ -32,29 +724,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
+    conn = get_read_connection(params.get('read_after')) if method == 'GET' else get_db_connection()
     cur = conn.cursor()
     
     try:
         if method == 'GET' and params.get('stats') == 'true':
-            cur.execute("""
+            etag, last_modified = get_resource_version(cur, 'groups')
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            execute_prepared(cur, """
                 SELECT 
                     g.id,
                     g.name,
                     g.platform,
                     g.avatar,
                     g.members,
-                    COALESCE(AVG(r.rating), 0) as avg_rating,
-                    COUNT(r.id) as reviews_count,
-                    COUNT(CASE WHEN r.rating = 5 THEN 1 END) as rating_5_count,
-                    COUNT(CASE WHEN r.rating = 4 THEN 1 END) as rating_4_count,
-                    COUNT(CASE WHEN r.rating = 3 THEN 1 END) as rating_3_count,
-                    COUNT(CASE WHEN r.rating = 2 THEN 1 END) as rating_2_count,
-                    COUNT(CASE WHEN r.rating = 1 THEN 1 END) as rating_1_count,
+                    COALESCE(s.rating_sum::numeric / NULLIF(s.reviews_count, 0), 0) as avg_rating,
+                    COALESCE(s.reviews_count, 0) as reviews_count,
+                    COALESCE(s.rating_5_count, 0) as rating_5_count,
+                    COALESCE(s.rating_4_count, 0) as rating_4_count,
+                    COALESCE(s.rating_3_count, 0) as rating_3_count,
+                    COALESCE(s.rating_2_count, 0) as rating_2_count,
+                    COALESCE(s.rating_1_count, 0) as rating_1_count,
                     g.created_at
                 FROM groups g
-                LEFT JOIN reviews r ON g.id = r.group_id
-                GROUP BY g.id, g.name, g.platform, g.avatar, g.members, g.created_at
+                LEFT JOIN group_rating_stats s ON g.id = s.group_id
                 ORDER BY reviews_count DESC, avg_rating DESC
             """)
             
@@ -78,21 +773,146 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'created_at': str(row['created_at'])
                 })
             
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': dumps_json({'stats': stats}),
+                'isBase64Encoded': False
+            }
+        
+        if method == 'GET' and params.get('leaderboard'):
+            try:
+                kind, platform, limit, offset = parse_leaderboard_params(params)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            etag, last_modified = get_resource_version(cur, 'leaderboard')
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': dumps_json({
+                    'leaderboard': fetch_leaderboard(cur, kind, platform, limit, offset),
+                    'kind': kind,
+                    'platform': platform,
+                    'limit': limit,
+                    'offset': offset,
+                    'refreshed_at': last_modified.isoformat() if last_modified else None
+                }),
+                'isBase64Encoded': False
+            }
+        
+        if params.get('analytics') and (
+            (method == 'GET' and ',' in params['analytics']) or
+            (method == 'POST' and params['analytics'] == 'batch')
+        ):
+            try:
+                if method == 'POST':
+                    raw_ids = parse_batch_body(event)
+                else:
+                    raw_ids = params['analytics'].split(',')
+                group_ids = parse_group_ids(raw_ids)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
             return {
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'stats': stats}),
+                'body': json.dumps(get_batch_analytics(cur, group_ids)),
+                'isBase64Encoded': False
+            }
+        
+        if method == 'GET' and params.get('detail'):
+            group_id = params['detail']
+            try:
+                if not group_id.isdigit() or int(group_id) > GROUP_ID_MAX:
+                    raise ValueError('detail must be a group id')
+                limit = int(params.get('limit') or DETAIL_REVIEWS_LIMIT_DEFAULT)
+                if limit < 1 or limit > DETAIL_REVIEWS_LIMIT_MAX:
+                    raise ValueError(f'limit must be between 1 and {DETAIL_REVIEWS_LIMIT_MAX}')
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            etag, last_modified = get_group_detail_version(cur)
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            execute_prepared(cur, GROUP_DETAIL_QUERY, {'id': int(group_id), 'limit': limit})
+            row = cur.fetchone()
+            if not row:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Group not found'}),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': row['body'],
                 'isBase64Encoded': False
             }
         
         if method == 'GET' and params.get('analytics'):
             group_id = params.get('analytics')
+            if not group_id.isdigit() or int(group_id) > GROUP_ID_MAX:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'analytics must be a group id'}),
+                    'isBase64Encoded': False
+                }
             cur.execute(
-                "SELECT platform, vk_group_id, telegram_channel_id FROM groups WHERE id = %s",
-                (group_id,)
+                "SELECT id, platform, vk_group_id, telegram_channel_id FROM groups WHERE id = %s",
+                (int(group_id),)
             )
             group_data = cur.fetchone()
             
@@ -109,11 +929,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             platform = group_data['platform']
             analytics = {}
+            deep = params.get('deep') == 'true'
+            snapshots = {} if deep else load_snapshot_analytics(cur, [group_data['id']])
             
-            if platform == 'vk' and group_data['vk_group_id']:
-                analytics = get_vk_analytics(group_data['vk_group_id'])
+            if deep:
+                analytics = get_cached_deep_analytics(group_data)
+            elif group_data['id'] in snapshots:
+                analytics = snapshots[group_data['id']]
+            elif platform == 'vk' and group_data['vk_group_id']:
+                vk_group_id = group_data['vk_group_id']
+                analytics = get_cached_analytics('vk', vk_group_id, lambda: get_vk_analytics(vk_group_id))
             elif platform == 'telegram' and group_data['telegram_channel_id']:
-                analytics = get_telegram_analytics(group_data['telegram_channel_id'])
+                channel_id = group_data['telegram_channel_id']
+                analytics = get_cached_analytics('telegram', channel_id, lambda: get_telegram_analytics(channel_id))
             else:
                 analytics = {
                     'available': False,
@@ -130,39 +958,158 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
+        if method == 'GET' and params.get('quota') == 'true':
+            cur.execute(
+                '''SELECT api, token_key, day, requests, throttled
+                   FROM api_quota_usage
+                   WHERE day > CURRENT_DATE - 7
+                   ORDER BY day DESC, api, token_key'''
+            )
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': dumps_json({
+                    'quota': cur.fetchall(),
+                    'circuits': {circuit.name: circuit.state for circuit in (VK_CIRCUIT, TGSTAT_CIRCUIT)}
+                }),
+                'isBase64Encoded': False
+            }
+        
         if method == 'GET':
-            search = params.get('search', '')
+            etag, last_modified = get_resource_version(cur, 'groups')
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            search = params.get('search', '').strip()
             platform = params.get('platform', '')
             sort_by = params.get('sort', 'created_at')
             
+            try:
+                limit = parse_search_limit(params.get('limit'), bool(search))
+                min_members = parse_members_bound(params.get('min_members'), 'min_members')
+                max_members = parse_members_bound(params.get('max_members'), 'max_members')
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
             query = '''
                 SELECT 
-                    g.id, g.name, g.platform, g.members, g.description, 
+                    g.id, g.name, g.platform, g.members, g.members_count, g.description, 
                     g.link, g.avatar, g.created_at,
-                    COALESCE(AVG(r.rating), 0) as rating,
-                    COUNT(r.id) as reviews_count
+                    COALESCE(s.rating_sum::numeric / NULLIF(s.reviews_count, 0), 0) as rating,
+                    COALESCE(s.reviews_count, 0) as reviews_count
                 FROM groups g
-                LEFT JOIN reviews r ON g.id = r.group_id
+                LEFT JOIN group_rating_stats s ON g.id = s.group_id
                 WHERE 1=1
             '''
+            args: Dict[str, Any] = {}
+            rank_order = None
             
             if search:
-                query += f" AND LOWER(g.name) LIKE LOWER('%{search}%')"
+                search_condition, rank_order = build_search_filter(search, params.get('mode', 'full'), args)
+                query += f' AND {search_condition}'
             
             if platform:
-                query += f" AND g.platform = '{platform}'"
+                query += ' AND g.platform = %(platform)s'
+                args['platform'] = platform
             
-            query += ' GROUP BY g.id'
+            if min_members is not None:
+                query += ' AND g.members_count >= %(min_members)s'
+                args['min_members'] = min_members
+            if max_members is not None:
+                query += ' AND g.members_count <= %(max_members)s'
+                args['max_members'] = max_members
             
-            if sort_by == 'rating':
+            if sort_by == 'members':
+                query += ' ORDER BY g.members_count DESC NULLS LAST, g.id'
+            elif sort_by == 'rating':
                 query += ' ORDER BY rating DESC'
             elif sort_by == 'reviews':
                 query += ' ORDER BY reviews_count DESC'
+            elif rank_order:
+                query += f' ORDER BY {rank_order}'
             else:
                 query += ' ORDER BY g.created_at DESC'
             
-            cur.execute(query)
-            groups = cur.fetchall()
+            if limit:
+                query += ' LIMIT %(limit)s'
+                args['limit'] = limit
+            
+            body = stream_query_json(conn, query, args)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': body,
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'POST' and params.get('collect') == 'true':
+            if not is_admin_request(event):
+                return forbidden_response()
+            try:
+                limit = parse_collector_limit(params.get('limit'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            summary = collect_analytics_snapshots(cur, limit)
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'success': True, **summary}),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'POST' and params.get('refresh_leaderboard') == 'true':
+            if not is_admin_request(event):
+                return forbidden_response()
+            version = refresh_leaderboard(cur, force=params.get('force') == 'true')
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'success': True, 'refreshed': version is not None, 'version': version}),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'POST' and params.get('reconcile') == 'true':
+            if not is_admin_request(event):
+                return forbidden_response()
+            repaired = reconcile_rating_stats(cur)
+            if repaired:
+                bump_resource_versions(cur, 'groups')
+            conn.commit()
             
             return {
                 'statusCode': 200,
@@ -170,7 +1117,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps([dict(g) for g in groups], default=str),
+                'body': json.dumps({'success': True, 'repaired_groups': repaired}),
                 'isBase64Encoded': False
             }
         
@@ -191,21 +1138,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cur.execute(
                     '''UPDATE groups 
                        SET name = %s, platform = %s, avatar = %s, members = %s, 
+                           members_count = CASE WHEN members IS DISTINCT FROM %s::text
+                                                THEN parse_members_count(%s::text) ELSE members_count END,
                            description = %s, link = %s, vk_group_id = %s, 
                            telegram_channel_id = %s, updated_at = CURRENT_TIMESTAMP
                        WHERE id = %s''',
-                    (name, platform, avatar, members, description, link,
+                    (name, platform, avatar, members, members, members, description, link,
                      vk_group_id if vk_group_id else None,
                      telegram_channel_id if telegram_channel_id else None,
                      group_id)
                 )
+                bump_resource_versions(cur, 'groups')
                 conn.commit()
                 
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        **read_after_headers(cur)
                     },
                     'body': json.dumps({'success': True, 'message': 'Group updated successfully'}),
                     'isBase64Encoded': False
@@ -230,18 +1181,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 cur.execute(
-                    '''INSERT INTO groups (name, platform, members, description, link, avatar) 
-                       VALUES (%s, %s, %s, %s, %s, %s) RETURNING id''',
-                    (name, platform, members, description, link, avatar)
+                    '''INSERT INTO groups (name, platform, members, members_count, description, link, avatar) 
+                       VALUES (%s, %s, %s, parse_members_count(%s::text), %s, %s, %s) RETURNING id''',
+                    (name, platform, members, members, description, link, avatar)
                 )
                 group_id = cur.fetchone()['id']
+                bump_resource_versions(cur, 'groups')
                 conn.commit()
                 
                 return {
                     'statusCode': 201,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        **read_after_headers(cur)
                     },
                     'body': json.dumps({'id': group_id, 'message': 'Group created successfully'}),
                     'isBase64Encoded': False
@@ -259,7 +1212,1188 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+ANALYTICS_BATCH_MAX = 100
+
+def parse_batch_body(event: Dict[str, Any]) -> List[Any]:
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except ValueError:
+        raise ValueError('Body must be valid JSON')
+    if not isinstance(body, dict):
+        raise ValueError('Body must be a JSON object with an "ids" array')
+    raw_ids = body.get('ids', [])
+    if not isinstance(raw_ids, list):
+        raise ValueError('"ids" must be an array')
+    return raw_ids
+
+def parse_group_ids(raw_ids: List[Any]) -> List[int]:
+    group_ids: List[int] = []
+    for raw_id in raw_ids:
+        try:
+            group_id = int(str(raw_id).strip())
+        except ValueError:
+            raise ValueError(f'Invalid group id: {raw_id}')
+        if group_id not in group_ids:
+            group_ids.append(group_id)
+    if not group_ids:
+        raise ValueError('At least one group id is required')
+    if len(group_ids) > ANALYTICS_BATCH_MAX:
+        raise ValueError(f'At most {ANALYTICS_BATCH_MAX} group ids per request')
+    return group_ids
+
+def get_batch_analytics(cur, group_ids: List[int]) -> Dict[str, Dict[str, Any]]:
+    cur.execute(
+        "SELECT id, platform, vk_group_id, telegram_channel_id FROM groups WHERE id = ANY(%s)",
+        (group_ids,)
+    )
+    rows = {row['id']: row for row in cur.fetchall()}
+    
+    snapshots = load_snapshot_analytics(cur, list(rows))
+    results: Dict[str, Dict[str, Any]] = {}
+    vk_groups: Dict[str, List[int]] = {}
+    telegram_channels: Dict[str, List[int]] = {}
+    for group_id in group_ids:
+        row = rows.get(group_id)
+        if not row:
+            results[str(group_id)] = {'available': False, 'error': 'Group not found'}
+        elif group_id in snapshots:
+            results[str(group_id)] = snapshots[group_id]
+        elif row['platform'] == 'vk' and row['vk_group_id']:
+            vk_groups.setdefault(row['vk_group_id'], []).append(group_id)
+        elif row['platform'] == 'telegram' and row['telegram_channel_id']:
+            telegram_channels.setdefault(row['telegram_channel_id'], []).append(group_id)
+        else:
+            results[str(group_id)] = {
+                'available': False,
+                'message': 'Статистика недоступна - не указан ID группы'
+            }
+    
+    vk_future = None
+    if vk_groups:
+        vk_future = submit_traced(
+            get_upstream_executor(),
+            get_cached_analytics_batch, 'vk', list(vk_groups), get_vk_analytics_batch
+        )
+    telegram = {}
+    if telegram_channels:
+        telegram = get_cached_analytics_batch('telegram', list(telegram_channels), get_telegram_analytics_batch)
+    vk = vk_future.result() if vk_future else {}
+    
+    for channels, analytics in ((vk_groups, vk), (telegram_channels, telegram)):
+        for channel_id, ids in channels.items():
+            for group_id in ids:
+                results[str(group_id)] = analytics[channel_id]
+    return {str(group_id): results[str(group_id)] for group_id in group_ids}
+
+SEARCH_LIMIT_DEFAULT = 50
+SEARCH_LIMIT_MAX = 200
+TRIGRAM_MIN_LENGTH = 3
+
+def parse_search_limit(value: Optional[str], searching: bool) -> Optional[int]:
+    if not value:
+        return SEARCH_LIMIT_DEFAULT if searching else None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > SEARCH_LIMIT_MAX:
+        raise ValueError(f'limit must be between 1 and {SEARCH_LIMIT_MAX}')
+    return limit
+
+def parse_members_bound(value: Optional[str], name: str) -> Optional[int]:
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError(f'{name} must be a non-negative integer')
+    return int(value)
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_search_filter(search: str, mode: str, args: Dict[str, Any]) -> Tuple[str, str]:
+    '''
+    Возвращает (условие WHERE, выражение ORDER BY) для поиска по группам.
+    prefix - подсказки при вводе по индексу lower(name) text_pattern_ops;
+    full - подстрока в названии/описании и нечёткое совпадение по GIN pg_trgm.
+    Запросы короче трёх символов не дают триграмм, поэтому всегда идут префиксом.
+    '''
+    args['q'] = search
+    args['prefix'] = escape_like(search.lower()) + '%'
+    
+    if mode == 'prefix' or len(search) < TRIGRAM_MIN_LENGTH:
+        if len(search) < TRIGRAM_MIN_LENGTH:
+            return 'lower(g.name) LIKE %(prefix)s', 'lower(g.name)'
+        return 'lower(g.name) LIKE %(prefix)s', 'similarity(g.name, %(q)s) DESC, lower(g.name)'
+    
+    args['pattern'] = '%' + escape_like(search) + '%'
+    condition = '(g.name ILIKE %(pattern)s OR g.description ILIKE %(pattern)s OR g.name %% %(q)s)'
+    rank = (
+        '(lower(g.name) LIKE %(prefix)s) DESC, '
+        'similarity(g.name, %(q)s) + 0.5 * word_similarity(%(q)s, COALESCE(g.description, \'\')) DESC'
+    )
+    return condition, rank
+
+def reconcile_rating_stats(cur) -> List[int]:
+    '''
+    Пересчитывает group_rating_stats по таблице reviews и чинит расхождения.
+    Отзывы, ещё ждущие в review_outbox, не учитываются: их добавит воркер.
+    Блокировка не даёт воркеру применить пачку посреди пересчёта.
+    '''
+    cur.execute('LOCK TABLE group_rating_stats IN SHARE ROW EXCLUSIVE MODE')
+    cur.execute('''
+        INSERT INTO group_rating_stats AS s (
+            group_id, reviews_count, rating_sum,
+            rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count
+        )
+        SELECT
+            g.id,
+            COUNT(r.id),
+            COALESCE(SUM(r.rating), 0),
+            COUNT(CASE WHEN r.rating = 1 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 2 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 3 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 4 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 5 THEN 1 END)
+        FROM groups g
+        LEFT JOIN reviews r ON g.id = r.group_id AND NOT EXISTS (
+            SELECT 1 FROM review_outbox o WHERE o.review_id = r.id AND o.processed_at IS NULL
+        )
+        GROUP BY g.id
+        ON CONFLICT (group_id) DO UPDATE SET
+            reviews_count = EXCLUDED.reviews_count,
+            rating_sum = EXCLUDED.rating_sum,
+            rating_1_count = EXCLUDED.rating_1_count,
+            rating_2_count = EXCLUDED.rating_2_count,
+            rating_3_count = EXCLUDED.rating_3_count,
+            rating_4_count = EXCLUDED.rating_4_count,
+            rating_5_count = EXCLUDED.rating_5_count,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE (s.reviews_count, s.rating_sum, s.rating_1_count, s.rating_2_count,
+               s.rating_3_count, s.rating_4_count, s.rating_5_count)
+            IS DISTINCT FROM
+              (EXCLUDED.reviews_count, EXCLUDED.rating_sum, EXCLUDED.rating_1_count,
+               EXCLUDED.rating_2_count, EXCLUDED.rating_3_count, EXCLUDED.rating_4_count,
+               EXCLUDED.rating_5_count)
+        RETURNING s.group_id
+    ''')
+    return [row['group_id'] for row in cur.fetchall()]
+
+DETAIL_REVIEWS_LIMIT_DEFAULT = 20
+DETAIL_REVIEWS_LIMIT_MAX = 100
+GROUP_ID_MAX = 2147483647
+
+# Вся страница группы собирается в Postgres: строка группы, распределение оценок
+# и первая страница отзывов с курсором в формате reviews?cursor= ([created_at, id] в base64url).
+# К group_rating_stats добавляются отзывы, ещё ждущие воркера в review_outbox:
+# воркер применяет их и ставит processed_at в одной транзакции, поэтому
+# в одном снимке каждый отзыв учтён ровно один раз
+GROUP_DETAIL_QUERY = '''
+    SELECT json_build_object(
+        'group', json_build_object(
+            'id', g.id,
+            'name', g.name,
+            'platform', g.platform,
+            'members', g.members,
+            'members_count', g.members_count,
+            'description', g.description,
+            'link', g.link,
+            'avatar', g.avatar,
+            'created_at', g.created_at,
+            'rating', COALESCE(
+                (COALESCE(s.rating_sum, 0) + pending.rating_sum)::numeric
+                / NULLIF(COALESCE(s.reviews_count, 0) + pending.reviews_count, 0),
+                0
+            ),
+            'reviews_count', COALESCE(s.reviews_count, 0) + pending.reviews_count
+        ),
+        'rating_distribution', json_build_object(
+            '5', COALESCE(s.rating_5_count, 0) + pending.rating_5_count,
+            '4', COALESCE(s.rating_4_count, 0) + pending.rating_4_count,
+            '3', COALESCE(s.rating_3_count, 0) + pending.rating_3_count,
+            '2', COALESCE(s.rating_2_count, 0) + pending.rating_2_count,
+            '1', COALESCE(s.rating_1_count, 0) + pending.rating_1_count
+        ),
+        'reviews', COALESCE(page.reviews, '[]'::json),
+        'next_cursor', rtrim(translate(encode(convert_to(page.last_key, 'UTF8'), 'base64'), E'+/\n', '-_'), '=')
+    )::text as body
+    FROM groups g
+    LEFT JOIN group_rating_stats s ON g.id = s.group_id
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*) as reviews_count,
+            COALESCE(SUM(o.rating), 0) as rating_sum,
+            COUNT(*) FILTER (WHERE o.rating = 1) as rating_1_count,
+            COUNT(*) FILTER (WHERE o.rating = 2) as rating_2_count,
+            COUNT(*) FILTER (WHERE o.rating = 3) as rating_3_count,
+            COUNT(*) FILTER (WHERE o.rating = 4) as rating_4_count,
+            COUNT(*) FILTER (WHERE o.rating = 5) as rating_5_count
+        FROM review_outbox o
+        WHERE o.group_id = g.id AND o.processed_at IS NULL
+    ) pending
+    LEFT JOIN LATERAL (
+        SELECT
+            json_agg(json_build_object(
+                'id', r.id,
+                'group_id', r.group_id,
+                'user_name', r.user_name,
+                'user_avatar', r.user_avatar,
+                'rating', r.rating,
+                'text', r.text,
+                'created_at', r.created_at,
+                'group_name', g.name
+            ) ORDER BY r.created_at DESC, r.id DESC) FILTER (WHERE r.position <= %(limit)s) as reviews,
+            MAX(json_build_array(r.created_at, r.id)::text) FILTER (WHERE r.position = %(limit)s AND r.fetched > %(limit)s) as last_key
+        FROM (
+            SELECT latest.*,
+                   ROW_NUMBER() OVER (ORDER BY latest.created_at DESC, latest.id DESC) as position,
+                   COUNT(*) OVER () as fetched
+            FROM (
+                SELECT * FROM reviews
+                WHERE group_id = g.id
+                ORDER BY created_at DESC, id DESC
+                LIMIT %(limit)s + 1
+            ) latest
+        ) r
+    ) page ON TRUE
+    WHERE g.id = %(id)s
+'''
+
+def get_group_detail_version(cur) -> Tuple[str, Optional[datetime]]:
+    '''
+    Версия страницы группы: счётчики групп и отзывов плюс последнее событие
+    review_outbox, как в reviews, чтобы новый отзыв был виден сразу
+    '''
+    execute_prepared(cur, '''
+        SELECT g.version as groups_version, r.version as reviews_version, o.id as outbox_id,
+               GREATEST(g.updated_at, r.updated_at, o.created_at) as updated_at
+        FROM cache_versions g
+        JOIN cache_versions r ON r.resource = 'reviews'
+        LEFT JOIN LATERAL (
+            SELECT id, created_at FROM review_outbox ORDER BY id DESC LIMIT 1
+        ) o ON TRUE
+        WHERE g.resource = 'groups'
+    ''')
+    row = cur.fetchone()
+    if not row:
+        return 'W/"detail-0"', None
+    return (
+        f'W/"detail-{row["groups_version"]}.{row["reviews_version"]}.{row["outbox_id"] or 0}"',
+        http_last_modified(row['updated_at'])
+    )
+
+LEADERBOARD_LIMIT_DEFAULT = 20
+LEADERBOARD_LIMIT_MAX = 100
+LEADERBOARD_KINDS = ('rating', 'reviews')
+LEADERBOARD_PLATFORMS = ('vk', 'telegram', 'all')
+
+def parse_leaderboard_params(params: Dict[str, Any]) -> Tuple[str, str, int, int]:
+    kind = params.get('leaderboard') or 'rating'
+    if kind == 'true':
+        kind = 'rating'
+    if kind not in LEADERBOARD_KINDS:
+        raise ValueError(f"leaderboard must be one of: {', '.join(LEADERBOARD_KINDS)}")
+    platform = params.get('platform') or 'all'
+    if platform not in LEADERBOARD_PLATFORMS:
+        raise ValueError(f"platform must be one of: {', '.join(LEADERBOARD_PLATFORMS)}")
+    try:
+        limit = int(params.get('limit') or LEADERBOARD_LIMIT_DEFAULT)
+        offset = int(params.get('offset') or 0)
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if limit < 1 or limit > LEADERBOARD_LIMIT_MAX:
+        raise ValueError(f'limit must be between 1 and {LEADERBOARD_LIMIT_MAX}')
+    if offset < 0:
+        raise ValueError('offset must not be negative')
+    return kind, platform, limit, offset
+
+def fetch_leaderboard(cur, kind: str, platform: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    '''
+    Читает страницу рейтинга из group_leaderboard. Места посчитаны заранее,
+    поэтому offset - это диапазон по индексу (platform, rank), а не пропуск строк.
+    '''
+    rank_column = f'{kind}_rank' if platform != 'all' else f'{kind}_rank_all'
+    query = f'''
+        SELECT group_id, name, platform, avatar, members,
+               avg_rating, weighted_rating, reviews_count, {rank_column} AS rank
+        FROM group_leaderboard
+        WHERE {rank_column} > %(offset)s AND {rank_column} <= %(end)s
+    '''
+    args: Dict[str, Any] = {'offset': offset, 'end': offset + limit}
+    if platform != 'all':
+        query += ' AND platform = %(platform)s'
+        args['platform'] = platform
+    execute_prepared(cur, query + f' ORDER BY {rank_column}', args)
+    
+    return [
+        {
+            'rank': row['rank'],
+            'id': row['group_id'],
+            'name': row['name'],
+            'platform': row['platform'],
+            'avatar': row['avatar'],
+            'members_count': row['members'],
+            'avg_rating': round(float(row['avg_rating']), 1),
+            'weighted_rating': round(float(row['weighted_rating']), 2),
+            'reviews_count': row['reviews_count']
+        }
+        for row in cur.fetchall()
+    ]
+
+def refresh_leaderboard(cur, force: bool = False) -> Optional[int]:
+    '''
+    Пересобирает group_leaderboard, если с прошлого раза менялись группы или отзывы.
+    Версия 'leaderboard' в cache_versions хранит версию 'groups', с которой
+    собран рейтинг, и служит ETag для ?leaderboard=. Возвращает эту версию
+    или None, если пересборка не понадобилась.
+    '''
+    cur.execute(
+        "SELECT resource, version FROM cache_versions WHERE resource IN ('groups', 'leaderboard')"
+    )
+    versions = {row['resource']: row['version'] for row in cur.fetchall()}
+    source_version = versions.get('groups', 0)
+    if not force and versions.get('leaderboard') == source_version:
+        return None
+    
+    cur.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY group_leaderboard')
+    cur.execute(
+        """UPDATE cache_versions
+           SET version = %s, updated_at = clock_timestamp()
+           WHERE resource = 'leaderboard'""",
+        (source_version,)
+    )
+    return source_version
+
+SNAPSHOT_MAX_AGE = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', '172800'))
+SNAPSHOT_HISTORY_DAYS = 30
+COLLECTOR_INTERVAL = int(os.environ.get('COLLECTOR_INTERVAL', '3600'))
+COLLECTOR_BATCH_SIZE = int(os.environ.get('COLLECTOR_BATCH_SIZE', '200'))
+COLLECTOR_CONCURRENCY = int(os.environ.get('COLLECTOR_CONCURRENCY', '4'))
+COLLECTOR_LIMIT_MAX = 2000
+VK_BATCH_SIZE = 100
+
+def parse_collector_limit(value: Optional[str]) -> int:
+    if not value:
+        return COLLECTOR_BATCH_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > COLLECTOR_LIMIT_MAX:
+        raise ValueError(f'limit must be between 1 and {COLLECTOR_LIMIT_MAX}')
+    return limit
+
+def collect_analytics_snapshots(cur, limit: int) -> Dict[str, int]:
+    '''
+    Точка входа планировщика: обходит группы с давно не обновлявшимися
+    снимками, забирает метрики с ограниченной параллельностью и пишет их
+    в analytics_snapshots. Запросы аналитики читают уже отсюда.
+    '''
+    cur.execute('''
+        SELECT g.id, g.platform, g.vk_group_id, g.telegram_channel_id
+        FROM groups g
+        LEFT JOIN LATERAL (
+            SELECT s.collected_at
+            FROM analytics_snapshots s
+            WHERE s.group_id = g.id
+            ORDER BY s.collected_at DESC
+            LIMIT 1
+        ) last ON TRUE
+        WHERE ((g.platform = 'vk' AND COALESCE(g.vk_group_id, '') <> '')
+               OR (g.platform = 'telegram' AND COALESCE(g.telegram_channel_id, '') <> ''))
+          AND (last.collected_at IS NULL OR last.collected_at < now() - make_interval(secs => %s))
+          AND NOT EXISTS (
+              SELECT 1 FROM analytics_cache c
+              WHERE c.platform = g.platform
+                AND c.channel_id = CASE WHEN g.platform = 'vk' THEN g.vk_group_id ELSE g.telegram_channel_id END
+                AND c.expires_at > now()
+                AND c.payload @> '{"not_found": true}'
+          )
+        ORDER BY last.collected_at NULLS FIRST
+        LIMIT %s
+    ''', (COLLECTOR_INTERVAL, limit))
+    rows = cur.fetchall()
+    
+    vk_rows = [row for row in rows if row['platform'] == 'vk']
+    telegram_rows = [row for row in rows if row['platform'] == 'telegram']
+    
+    payloads: Dict[int, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=COLLECTOR_CONCURRENCY) as executor:
+        vk_chunks = [vk_rows[i:i + VK_BATCH_SIZE] for i in range(0, len(vk_rows), VK_BATCH_SIZE)]
+        vk_futures = [
+            (chunk, submit_traced(executor, get_vk_analytics_batch, [row['vk_group_id'] for row in chunk]))
+            for chunk in vk_chunks
+        ]
+        telegram_futures = [
+            (row, submit_traced(executor, get_telegram_analytics, row['telegram_channel_id']))
+            for row in telegram_rows
+        ]
+        for row, future in telegram_futures:
+            payloads[row['id']] = future.result()
+        for chunk, future in vk_futures:
+            batch = future.result()
+            for row in chunk:
+                payloads[row['id']] = batch.get(row['vk_group_id'], {'available': False})
+    
+    snapshots = []
+    for row in rows:
+        payload = payloads.get(row['id'], {})
+        if payload.get('available'):
+            views = payload.get('avg_views', payload.get('avg_post_reach'))
+            snapshots.append((row['id'], row['platform'], payload.get('subscribers'), views, Json(payload)))
+        elif payload.get('not_found'):
+            channel_id = row['vk_group_id'] if row['platform'] == 'vk' else row['telegram_channel_id']
+            store_analytics_entry((row['platform'], channel_id), payload)
+    members_counts = [(snapshot[0], snapshot[2]) for snapshot in snapshots if snapshot[2]]
+    if update_members_counts(cur, members_counts):
+        bump_resource_versions(cur, 'groups')
+    if snapshots:
+        cur.execute('SELECT ensure_analytics_snapshot_partitions(1)')
+        execute_values(
+            cur,
+            '''INSERT INTO analytics_snapshots (group_id, platform, subscribers, avg_views, metrics)
+               VALUES %s''',
+            snapshots
+        )
+    
+    return {'collected': len(snapshots), 'failed': len(rows) - len(snapshots)}
+
+def update_members_counts(cur, counts: List[Tuple[int, int]]) -> int:
+    '''
+    Переносит точное число подписчиков из VK API / TGStat в groups.members_count.
+    Строки без изменений не трогаются, чтобы не сбрасывать версию кэша зря.
+    '''
+    if not counts:
+        return 0
+    execute_values(
+        cur,
+        '''UPDATE groups g SET members_count = v.members_count
+           FROM (VALUES %s) AS v(id, members_count)
+           WHERE g.id = v.id AND g.members_count IS DISTINCT FROM v.members_count''',
+        counts,
+        page_size=len(counts)
+    )
+    return cur.rowcount
+
+def load_snapshot_analytics(cur, group_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    '''
+    Последний снимок плюс дневная история за SNAPSHOT_HISTORY_DAYS для каждой группы.
+    Группы без свежего снимка в результат не попадают.
+    '''
+    if not group_ids:
+        return {}
+    cur.execute(
+        '''SELECT DISTINCT ON (group_id) group_id, collected_at, metrics
+           FROM analytics_snapshots
+           WHERE group_id = ANY(%s) AND collected_at > now() - make_interval(secs => %s)
+           ORDER BY group_id, collected_at DESC''',
+        (group_ids, SNAPSHOT_MAX_AGE)
+    )
+    latest = {row['group_id']: row for row in cur.fetchall()}
+    if not latest:
+        return {}
+    
+    cur.execute(
+        '''SELECT group_id, collected_at::date as day,
+                  MAX(subscribers) as subscribers, MAX(avg_views) as views
+           FROM analytics_snapshots
+           WHERE group_id = ANY(%s) AND collected_at >= now() - make_interval(days => %s)
+           GROUP BY group_id, day
+           ORDER BY group_id, day''',
+        (list(latest), SNAPSHOT_HISTORY_DAYS)
+    )
+    subscribers_history: Dict[int, List[Dict[str, Any]]] = {}
+    views_history: Dict[int, List[Dict[str, Any]]] = {}
+    for row in cur.fetchall():
+        day = row['day'].isoformat()
+        subscribers_history.setdefault(row['group_id'], []).append(
+            {'date': day, 'subscribers': row['subscribers'] or 0}
+        )
+        views_history.setdefault(row['group_id'], []).append(
+            {'date': day, 'views': row['views'] or 0}
+        )
+    
+    results = {}
+    for group_id, row in latest.items():
+        analytics = dict(row['metrics'])
+        analytics['subscribers_history'] = merge_history(
+            analytics.get('subscribers_history', []), subscribers_history.get(group_id, [])
+        )
+        analytics['views_history'] = merge_history(
+            analytics.get('views_history', []), views_history.get(group_id, [])
+        )
+        analytics['collected_at'] = row['collected_at'].isoformat()
+        results[group_id] = analytics
+    return results
+
+def merge_history(upstream: List[Dict[str, Any]], own: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_date = {str(item.get('date')): item for item in upstream}
+    for item in own:
+        by_date[item['date']] = item
+    return [by_date[date] for date in sorted(by_date)][-SNAPSHOT_HISTORY_DAYS:]
+
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', '900'))
+ANALYTICS_PARTIAL_TTL = int(os.environ.get('ANALYTICS_PARTIAL_TTL', '60'))
+ANALYTICS_NEGATIVE_TTL = int(os.environ.get('ANALYTICS_NEGATIVE_TTL', '300'))
+ANALYTICS_DEEP_TTL = int(os.environ.get('ANALYTICS_DEEP_TTL', '21600'))
+ANALYTICS_DEEP_PARTIAL_TTL = int(os.environ.get('ANALYTICS_DEEP_PARTIAL_TTL', '3600'))
+DEEP_ANALYTICS_SUFFIX = ':deep'
+ANALYTICS_CACHE_MAX_STALE = int(os.environ.get('ANALYTICS_CACHE_MAX_STALE', '86400'))
+ANALYTICS_CACHE_LRU_SIZE = int(os.environ.get('ANALYTICS_CACHE_LRU_SIZE', '256'))
+ANALYTICS_REFRESH_LEASE = 30
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, str], entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+_analytics_lru = LRUCache(ANALYTICS_CACHE_LRU_SIZE)
+_analytics_inflight: Dict[Tuple[str, str], threading.Event] = {}
+_analytics_inflight_lock = threading.Lock()
+
+def get_cached_analytics(platform: str, channel_id: str,
+                         fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    '''
+    Кэш аналитики: LRU в процессе поверх таблицы analytics_cache.
+    Свежая запись отдаётся сразу, устаревшая (не старше ANALYTICS_CACHE_MAX_STALE) -
+    тоже сразу, а обновление уходит в фоновый поток (см. start_background_refresh). Параллельные обновления
+    одного ключа схлопываются: внутри процесса через Event, между инстансами -
+    через аренду refreshing_until в Postgres.
+    '''
+    key = (platform, channel_id)
+    entry = _analytics_lru.get(key)
+    if entry is None:
+        entry = load_analytics_entry(key)
+        if entry is not None:
+            _analytics_lru.put(key, entry)
+    
+    now = time.time()
+    if entry is not None and now < entry['expires_at']:
+        return with_cache_info(entry)
+    
+    if entry is not None and now - entry['expires_at'] < ANALYTICS_CACHE_MAX_STALE:
+        start_background_refresh(
+            platform, [channel_id],
+            lambda claimed: refresh_analytics(key, fetch, False, claimed=True)
+        )
+        return with_cache_info(entry)
+    
+    refreshed = refresh_analytics(key, fetch, True)
+    if refreshed is None:
+        return {
+            'available': False,
+            'message': 'Статистика временно недоступна, попробуйте позже'
+        }
+    if not refreshed.get('cached', True):
+        return refreshed['payload']
+    return with_cache_info(refreshed)
+
+def with_cache_info(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **entry['payload'],
+        'cached_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(entry['fetched_at'])),
+        'stale': time.time() >= entry['expires_at']
+    }
+
+def start_background_refresh(platform: str, channel_ids: List[str], run: Callable[[List[str]], Any]) -> None:
+    '''
+    Обновление устаревших записей после ответа. Аренда берётся заранее, в потоке
+    запроса: после ответа контейнер может быть заморожен, и поток не успеет её взять.
+    Снимает аренду только сам поток, когда запись сохранена или обновление не удалось;
+    если контейнер заморозили раньше, аренда истекает через ANALYTICS_REFRESH_LEASE.
+    '''
+    with _analytics_inflight_lock:
+        channel_ids = [channel_id for channel_id in channel_ids if (platform, channel_id) not in _analytics_inflight]
+    claimed = claim_analytics_refresh_many(platform, channel_ids) if channel_ids else []
+    if claimed:
+        threading.Thread(target=run, args=(claimed,), daemon=True).start()
+
+def refresh_analytics(key: Tuple[str, str], fetch: Callable[[], Dict[str, Any]],
+                      wait: bool, claimed: bool = False) -> Optional[Dict[str, Any]]:
+    with _analytics_inflight_lock:
+        done = _analytics_inflight.get(key)
+        leader = done is None
+        if leader:
+            done = threading.Event()
+            _analytics_inflight[key] = done
+    
+    if not leader:
+        # Ключ уже обновляет другой поток процесса: своя аренда больше не нужна
+        if claimed:
+            release_analytics_refresh(key)
+        done.wait(ANALYTICS_REFRESH_LEASE)
+        return _analytics_lru.get(key)
+    
+    try:
+        if not claimed and not claim_analytics_refresh(key):
+            return wait_for_analytics_refresh(key) if wait else None
+        payload = fetch()
+        if not is_cacheable(payload):
+            release_analytics_refresh(key)
+            return {'payload': payload, 'cached': False}
+        entry = store_analytics_entry(key, payload)
+        _analytics_lru.put(key, entry)
+        return entry
+    except Exception:
+        release_analytics_refresh(key)
+        raise
+    finally:
+        with _analytics_inflight_lock:
+            _analytics_inflight.pop(key, None)
+        done.set()
+
+def get_cached_analytics_batch(platform: str, channel_ids: List[str],
+                               fetch_many: Callable[[List[str]], Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    '''
+    Пакетный вариант get_cached_analytics: записи читаются одним запросом,
+    промахи и устаревшие ключи обновляются одним вызовом fetch_many
+    '''
+    entries: Dict[str, Dict[str, Any]] = {}
+    not_in_lru = []
+    for channel_id in channel_ids:
+        entry = _analytics_lru.get((platform, channel_id))
+        if entry is None:
+            not_in_lru.append(channel_id)
+        else:
+            entries[channel_id] = entry
+    if not_in_lru:
+        for channel_id, entry in load_analytics_entries(platform, not_in_lru).items():
+            _analytics_lru.put((platform, channel_id), entry)
+            entries[channel_id] = entry
+    
+    now = time.time()
+    results: Dict[str, Dict[str, Any]] = {}
+    to_refresh = []
+    to_fetch = []
+    for channel_id in channel_ids:
+        entry = entries.get(channel_id)
+        if entry is not None and now - entry['expires_at'] < ANALYTICS_CACHE_MAX_STALE:
+            results[channel_id] = with_cache_info(entry)
+            if now >= entry['expires_at']:
+                to_refresh.append(channel_id)
+        else:
+            to_fetch.append(channel_id)
+    
+    if to_refresh:
+        start_background_refresh(
+            platform, to_refresh,
+            lambda claimed: refresh_analytics_batch(platform, claimed, fetch_many, False, claimed=claimed)
+        )
+    if to_fetch:
+        results.update(refresh_analytics_batch(platform, to_fetch, fetch_many, True))
+    return results
+
+def refresh_analytics_batch(platform: str, channel_ids: List[str],
+                            fetch_many: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+                            wait: bool, claimed: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    if claimed is None:
+        claimed = claim_analytics_refresh_many(platform, channel_ids)
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        fetched = fetch_many(claimed) if claimed else {}
+    except Exception:
+        for channel_id in claimed:
+            release_analytics_refresh((platform, channel_id))
+        raise
+    
+    for channel_id in claimed:
+        payload = fetched.get(channel_id) or {'available': False, 'message': 'Нет ответа от API'}
+        if is_cacheable(payload):
+            entry = store_analytics_entry((platform, channel_id), payload)
+            _analytics_lru.put((platform, channel_id), entry)
+            results[channel_id] = with_cache_info(entry)
+        else:
+            release_analytics_refresh((platform, channel_id))
+            results[channel_id] = payload
+    
+    pending = [channel_id for channel_id in channel_ids if channel_id not in results]
+    deadline = time.time() + ANALYTICS_REFRESH_LEASE
+    while wait and pending and time.time() < deadline:
+        time.sleep(0.5)
+        for channel_id, entry in load_analytics_entries(platform, pending).items():
+            if entry['expires_at'] > time.time():
+                _analytics_lru.put((platform, channel_id), entry)
+                results[channel_id] = with_cache_info(entry)
+        pending = [channel_id for channel_id in pending if channel_id not in results]
+    for channel_id in pending:
+        results[channel_id] = {
+            'available': False,
+            'message': 'Статистика временно недоступна, попробуйте позже'
+        }
+    return results
+
+def is_cacheable(payload: Dict[str, Any]) -> bool:
+    # Ответ "не найдено" кэшируется на ANALYTICS_NEGATIVE_TTL, сбои и отказы размыкателя - нет
+    return bool(payload.get('available') or payload.get('not_found'))
+
+def analytics_ttl(payload: Dict[str, Any]) -> int:
+    if payload.get('not_found'):
+        return ANALYTICS_NEGATIVE_TTL
+    if payload.get('deep'):
+        # Неполный глубокий анализ всё равно опирается на сотни постов, а его
+        # повтор - самый дорогой запрос к API: перезапрашивается не раз в минуту
+        return ANALYTICS_DEEP_PARTIAL_TTL if payload.get('partial') else ANALYTICS_DEEP_TTL
+    if payload.get('partial'):
+        return ANALYTICS_PARTIAL_TTL
+    return ANALYTICS_CACHE_TTL
+
+def load_analytics_entries(platform: str, channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    with db_cursor() as cur:
+        cur.execute(
+            '''SELECT channel_id, payload,
+                      EXTRACT(EPOCH FROM fetched_at) as fetched_at,
+                      EXTRACT(EPOCH FROM expires_at) as expires_at
+               FROM analytics_cache
+               WHERE platform = %s AND channel_id = ANY(%s) AND payload IS NOT NULL''',
+            (platform, channel_ids)
+        )
+        rows = cur.fetchall()
+    return {
+        row['channel_id']: {
+            'payload': row['payload'],
+            'fetched_at': float(row['fetched_at']),
+            'expires_at': float(row['expires_at'])
+        }
+        for row in rows
+    }
+
+def claim_analytics_refresh_many(platform: str, channel_ids: List[str]) -> List[str]:
+    with db_cursor() as cur:
+        cur.execute(
+            '''INSERT INTO analytics_cache (platform, channel_id, expires_at, refreshing_until)
+               SELECT %s, channel_id, to_timestamp(0), now() + make_interval(secs => %s)
+               FROM unnest(%s::varchar[]) AS channel_id
+               ON CONFLICT (platform, channel_id) DO UPDATE
+                   SET refreshing_until = EXCLUDED.refreshing_until
+                   WHERE analytics_cache.refreshing_until IS NULL
+                      OR analytics_cache.refreshing_until < now()
+               RETURNING channel_id''',
+            (platform, ANALYTICS_REFRESH_LEASE, channel_ids)
+        )
+        claimed = {row['channel_id'] for row in cur.fetchall()}
+    return [channel_id for channel_id in channel_ids if channel_id in claimed]
+
+def load_analytics_entry(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    with db_cursor() as cur:
+        execute_prepared(
+            cur,
+            '''SELECT payload,
+                      EXTRACT(EPOCH FROM fetched_at) as fetched_at,
+                      EXTRACT(EPOCH FROM expires_at) as expires_at
+               FROM analytics_cache
+               WHERE platform = %s AND channel_id = %s AND payload IS NOT NULL''',
+            key
+        )
+        row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        'payload': row['payload'],
+        'fetched_at': float(row['fetched_at']),
+        'expires_at': float(row['expires_at'])
+    }
+
+def claim_analytics_refresh(key: Tuple[str, str]) -> bool:
+    with db_cursor() as cur:
+        cur.execute(
+            '''INSERT INTO analytics_cache (platform, channel_id, expires_at, refreshing_until)
+               VALUES (%s, %s, to_timestamp(0), now() + make_interval(secs => %s))
+               ON CONFLICT (platform, channel_id) DO UPDATE
+                   SET refreshing_until = EXCLUDED.refreshing_until
+                   WHERE analytics_cache.refreshing_until IS NULL
+                      OR analytics_cache.refreshing_until < now()
+               RETURNING 1''',
+            (*key, ANALYTICS_REFRESH_LEASE)
+        )
+        return cur.fetchone() is not None
+
+def release_analytics_refresh(key: Tuple[str, str]) -> None:
+    with db_cursor() as cur:
+        cur.execute(
+            'UPDATE analytics_cache SET refreshing_until = NULL WHERE platform = %s AND channel_id = %s',
+            key
+        )
+
+def wait_for_analytics_refresh(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    deadline = time.time() + ANALYTICS_REFRESH_LEASE
+    while time.time() < deadline:
+        time.sleep(0.5)
+        entry = load_analytics_entry(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            _analytics_lru.put(key, entry)
+            return entry
+    return None
+
+def store_analytics_entry(key: Tuple[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+    fetched_at = time.time()
+    expires_at = fetched_at + analytics_ttl(payload)
+    with db_cursor() as cur:
+        if payload.get('available') and payload.get('subscribers'):
+            column = 'vk_group_id' if key[0] == 'vk' else 'telegram_channel_id'
+            cur.execute(
+                f'''UPDATE groups SET members_count = %s
+                    WHERE platform = %s AND {column} = %s AND members_count IS DISTINCT FROM %s''',
+                (payload['subscribers'], key[0], key[1].removesuffix(DEEP_ANALYTICS_SUFFIX), payload['subscribers'])
+            )
+            if cur.rowcount:
+                bump_resource_versions(cur, 'groups')
+        cur.execute(
+            '''INSERT INTO analytics_cache (platform, channel_id, payload, fetched_at, expires_at)
+               VALUES (%s, %s, %s, to_timestamp(%s), to_timestamp(%s))
+               ON CONFLICT (platform, channel_id) DO UPDATE
+                   SET payload = EXCLUDED.payload,
+                       fetched_at = EXCLUDED.fetched_at,
+                       expires_at = EXCLUDED.expires_at,
+                       refreshing_until = NULL''',
+            (*key, Json(payload), fetched_at, expires_at)
+        )
+    return {'payload': payload, 'fetched_at': fetched_at, 'expires_at': expires_at}
+
+ANALYTICS_DEADLINE = float(os.environ.get('ANALYTICS_DEADLINE', '8'))
+UPSTREAM_TIMEOUT = 10
+VK_API_URL = os.environ.get('VK_API_URL', 'https://api.vk.com/method')
+TGSTAT_API_URL = os.environ.get('TGSTAT_API_URL', 'https://api.tgstat.ru')
+
+def create_http_session() -> 'requests.Session':
+    import requests
+    
+    class TracingSession(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            if _current_trace.get() is None:
+                return super().request(method, url, *args, **kwargs)
+            parsed = urlparse(url)
+            with trace_span('upstream', f'{method} {parsed.netloc}{parsed.path}'):
+                return super().request(method, url, *args, **kwargs)
+    
+    session = TracingSession()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    return session
+
+def submit_traced(executor: ThreadPoolExecutor, fn: Callable, *args: Any) -> Future:
+    # Переносит текущую трассировку в поток пула
+    return executor.submit(copy_context().run, fn, *args)
+
+_http_session: Optional['requests.Session'] = None
+_upstream_executor: Optional[ThreadPoolExecutor] = None
+_upstream_lock = threading.Lock()
+
+def get_http_session() -> 'requests.Session':
+    global _http_session
+    if _http_session is None:
+        with _upstream_lock:
+            if _http_session is None:
+                with trace_span('import', 'requests'):
+                    _http_session = create_http_session()
+    return _http_session
+
+def get_upstream_executor() -> ThreadPoolExecutor:
+    global _upstream_executor
+    if _upstream_executor is None:
+        with _upstream_lock:
+            if _upstream_executor is None:
+                _upstream_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream')
+    return _upstream_executor
+
+class RateLimiter:
+    '''
+    Равномерно разносит вызовы одного API во времени внутри процесса
+    '''
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+UPSTREAM_MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', '4'))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get('UPSTREAM_BACKOFF_BASE', '0.5'))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get('UPSTREAM_BACKOFF_MAX', '30'))
+VK_THROTTLE_ERROR_CODES = {6, 9}
+TGSTAT_THROTTLE_MARKERS = ('too_many', 'limit', 'quota')
+
+VK_NOT_FOUND_ERROR_CODES = {100}
+TGSTAT_NOT_FOUND_MARKERS = ('not_found', 'not found')
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', '30'))
+
+class UpstreamError(RuntimeError):
+    def __init__(self, message: str, not_found: bool = False):
+        super().__init__(message)
+        self.not_found = not_found
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+class CircuitBreaker:
+    '''
+    Размыкатель на внешний API внутри инстанса: после failure_threshold сетевых
+    ошибок или ответов 5xx подряд вызовы сразу получают отказ. Раз в reset_timeout
+    пропускается один пробный запрос; его успех замыкает цепь обратно.
+    Ошибки самого API (лимиты, неверный ID) считаются ответом, а не сбоем.
+    '''
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            probing = self._probe_started is not None and now - self._probe_started < self.reset_timeout
+            if probing or now - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError('сервис временно недоступен')
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if self._probe_started is not None else 'open'
+
+VK_CIRCUIT = CircuitBreaker('vk', CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+TGSTAT_CIRCUIT = CircuitBreaker('tgstat', CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+def send_upstream(circuit: CircuitBreaker, send: Callable[[], 'requests.Response']) -> Tuple['requests.Response', Any]:
+    import requests
+    
+    try:
+        response = send()
+        if response.status_code >= 500:
+            raise UpstreamError(f'HTTP {response.status_code}')
+        data = response.json()
+    except (requests.RequestException, ValueError, UpstreamError):
+        circuit.record_failure()
+        raise
+    circuit.record_success()
+    return response, data
+
+TOKEN_BUCKET_ACQUIRE = '''
+    WITH bucket AS (
+        INSERT INTO api_rate_buckets AS b (api, token_key, tokens, updated_at)
+        VALUES (%(api)s, %(key)s, %(capacity)s - 1, clock_timestamp())
+        ON CONFLICT (api, token_key) DO UPDATE SET
+            tokens = LEAST(
+                %(capacity)s,
+                b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s
+            ) - 1,
+            updated_at = clock_timestamp()
+        RETURNING b.tokens
+    ), usage AS (
+        INSERT INTO api_quota_usage AS u (api, token_key, day, requests)
+        VALUES (%(api)s, %(key)s, CURRENT_DATE, 1)
+        ON CONFLICT (api, token_key, day) DO UPDATE SET requests = u.requests + 1
+    )
+    SELECT tokens FROM bucket
+'''
+
+_rate_limit_conn: Any = None
+_rate_limit_lock = threading.Lock()
+
+@contextmanager
+def rate_limit_cursor() -> Iterator[Any]:
+    '''
+    Отдельное соединение для token bucket: потоки аналитики (до 16 одновременно)
+    не занимают пул, из которого обслуживается сам запрос. Запросы к бакету
+    короткие и идут в autocommit, поэтому потоки проходят через одно соединение по очереди.
+    '''
+    global _rate_limit_conn
+    with _rate_limit_lock:
+        if _rate_limit_conn is None or _rate_limit_conn.closed:
+            _rate_limit_conn = psycopg2.connect(
+                os.environ.get('DATABASE_URL'),
+                connect_timeout=max(1, int(DB_POOL_TIMEOUT)),
+                cursor_factory=TracingDictCursor if TRACE_ENABLED else RealDictCursor
+            )
+            _rate_limit_conn.autocommit = True
+        try:
+            with _rate_limit_conn.cursor() as cur:
+                yield cur
+        except psycopg2.Error:
+            try:
+                _rate_limit_conn.close()
+            except psycopg2.Error:
+                pass
+            _rate_limit_conn = None
+            raise
+
+class TokenBucket:
+    '''
+    Token bucket на пару (API, токен) в api_rate_buckets, общий для всех инстансов.
+    Вызов всегда резервирует токен: отрицательный остаток - это очередь,
+    и вызывающий спит до своего слота вместо ошибки. Бэкофф после ответа
+    "слишком много запросов" записывается туда же как долг. Если база
+    недоступна, запросы разносит RateLimiter внутри процесса.
+    '''
+
+    def __init__(self, api: str, per_second: float, burst: float):
+        self.api = api
+        self.rate = per_second
+        self.capacity = burst
+        self._local = RateLimiter(per_second)
+
+    def acquire(self, token: str, deadline: float) -> None:
+        key = token_key(token)
+        try:
+            with rate_limit_cursor() as cur:
+                cur.execute(TOKEN_BUCKET_ACQUIRE, {
+                    'api': self.api, 'key': key, 'capacity': self.capacity, 'rate': self.rate
+                })
+                tokens = cur.fetchone()['tokens']
+        except psycopg2.Error:
+            self._local.wait()
+            return
+        
+        wait = -tokens / self.rate if tokens < 0 else 0.0
+        if wait > deadline - time.monotonic():
+            self._update(key, 'tokens = tokens + 1', 'requests = requests - 1')
+            raise TimeoutError('Очередь запросов к API длиннее оставшегося времени')
+        if wait > 0:
+            with trace_span('rate-wait', self.api):
+                time.sleep(wait)
+
+    def penalize(self, token: str, backoff: float) -> None:
+        self._update(
+            token_key(token),
+            f'tokens = LEAST(tokens, 0) - {float(backoff * self.rate)}',
+            'throttled = throttled + 1'
+        )
+
+    def _update(self, key: str, bucket_set: str, usage_set: str) -> None:
+        try:
+            with rate_limit_cursor() as cur:
+                cur.execute(
+                    f'''UPDATE api_rate_buckets SET {bucket_set}
+                       WHERE api = %(api)s AND token_key = %(key)s''',
+                    {'api': self.api, 'key': key}
+                )
+                cur.execute(
+                    f'''UPDATE api_quota_usage SET {usage_set}
+                       WHERE api = %(api)s AND token_key = %(key)s AND day = CURRENT_DATE''',
+                    {'api': self.api, 'key': key}
+                )
+        except psycopg2.Error:
+            pass
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+def backoff_delay(attempt: int) -> float:
+    delay = min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+VK_TOKEN_BUCKET = TokenBucket(
+    'vk',
+    float(os.environ.get('VK_RATE_LIMIT', '3')),
+    float(os.environ.get('VK_RATE_BURST', '3'))
+)
+TGSTAT_TOKEN_BUCKET = TokenBucket(
+    'tgstat',
+    float(os.environ.get('TGSTAT_RATE_LIMIT', '5')),
+    float(os.environ.get('TGSTAT_RATE_BURST', '5'))
+)
+
+def remaining_timeout(deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError('Превышено время ожидания')
+    return min(UPSTREAM_TIMEOUT, remaining)
+
+def tgstat_request(method: str, params: Dict[str, Any], token: str, deadline: float) -> Any:
+    for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+        TGSTAT_CIRCUIT.before_call()
+        TGSTAT_TOKEN_BUCKET.acquire(token, deadline)
+        response, data = send_upstream(TGSTAT_CIRCUIT, lambda: get_http_session().get(
+            f'{TGSTAT_API_URL}/{method}',
+            params={'token': token, **params},
+            timeout=remaining_timeout(deadline)
+        ))
+        if data.get('status') == 'ok':
+            return data.get('response')
+        
+        error = str(data.get('error', 'Unknown'))
+        if any(marker in error.lower() for marker in TGSTAT_NOT_FOUND_MARKERS):
+            raise UpstreamError(error, not_found=True)
+        throttled = response.status_code == 429 or any(marker in error.lower() for marker in TGSTAT_THROTTLE_MARKERS)
+        if not throttled or attempt == UPSTREAM_MAX_RETRIES:
+            raise UpstreamError(error)
+        TGSTAT_TOKEN_BUCKET.penalize(token, backoff_delay(attempt))
+
+def vk_request(method: str, params: Dict[str, Any], token: str, deadline: float, post: bool = False) -> Any:
+    '''
+    Вызов VK API через общий token bucket. Ошибки 6 и 9 (лимит частоты, flood control)
+    не отдаются клиенту: запрос встаёт в очередь после бэкоффа с джиттером.
+    '''
+    payload = {**params, 'access_token': token, 'v': '5.131'}
+    for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+        VK_CIRCUIT.before_call()
+        VK_TOKEN_BUCKET.acquire(token, deadline)
+        if post:
+            send = lambda: get_http_session().post(
+                f'{VK_API_URL}/{method}', data=payload, timeout=remaining_timeout(deadline)
+            )
+        else:
+            send = lambda: get_http_session().get(
+                f'{VK_API_URL}/{method}', params=payload, timeout=remaining_timeout(deadline)
+            )
+        _, data = send_upstream(VK_CIRCUIT, send)
+        if 'error' not in data:
+            return data.get('response')
+        
+        error = data['error']
+        if error.get('error_code') in VK_NOT_FOUND_ERROR_CODES:
+            raise UpstreamError(error.get('error_msg', 'Unknown'), not_found=True)
+        if error.get('error_code') not in VK_THROTTLE_ERROR_CODES or attempt == UPSTREAM_MAX_RETRIES:
+            raise UpstreamError(error.get('error_msg', 'Unknown'))
+        VK_TOKEN_BUCKET.penalize(token, backoff_delay(attempt))
 
 def get_vk_analytics(group_id: str) -> Dict[str, Any]:
     vk_token = os.environ.get('VK_API_TOKEN')
@@ -270,78 +2404,131 @@ def get_vk_analytics(group_id: str) -> Dict[str, Any]:
             'message': 'VK API токен не настроен'
         }
     
+    deadline = time.monotonic() + ANALYTICS_DEADLINE
+    
     try:
-        response = requests.get(
-            'https://api.vk.com/method/groups.getById',
-            params={
-                'group_id': group_id,
-                'fields': 'members_count,activity,description',
-                'access_token': vk_token,
-                'v': '5.131'
-            },
-            timeout=10
-        )
-        
-        data = response.json()
+        groups_info = vk_request('groups.getById', {
+            'group_id': group_id,
+            'fields': 'members_count,activity,description'
+        }, vk_token, deadline)
         
-        if 'error' in data:
-            return {
-                'available': False,
-                'message': f"Ошибка VK API: {data['error'].get('error_msg', 'Unknown')}"
-            }
-        
-        if 'response' not in data or not data['response']:
+        if not groups_info:
             return {
                 'available': False,
+                'not_found': True,
                 'message': 'Группа не найдена в VK'
             }
         
-        group_info = data['response'][0]
-        
-        wall_response = requests.get(
-            'https://api.vk.com/method/wall.get',
-            params={
-                'owner_id': f"-{group_info['id']}",
-                'count': 10,
-                'access_token': vk_token,
-                'v': '5.131'
-            },
-            timeout=10
-        )
-        
-        wall_data = wall_response.json()
-        posts = wall_data.get('response', {}).get('items', [])
+        group_info = groups_info[0]
+        wall = vk_request('wall.get', {
+            'owner_id': f"-{group_info['id']}",
+            'count': 10
+        }, vk_token, deadline)
+        return build_vk_analytics(group_info, wall or {})
         
-        total_likes = sum(post.get('likes', {}).get('count', 0) for post in posts)
-        total_comments = sum(post.get('comments', {}).get('count', 0) for post in posts)
-        total_reposts = sum(post.get('reposts', {}).get('count', 0) for post in posts)
-        total_views = sum(post.get('views', {}).get('count', 0) for post in posts)
-        
-        avg_engagement = 0
-        if posts and group_info.get('members_count', 0) > 0:
-            total_engagement = total_likes + total_comments + total_reposts
-            avg_engagement = (total_engagement / len(posts) / group_info['members_count']) * 100
-        
-        return {
-            'available': True,
-            'platform': 'vk',
-            'subscribers': group_info.get('members_count', 0),
-            'posts_count': wall_data.get('response', {}).get('count', 0),
-            'recent_posts': len(posts),
-            'avg_likes': total_likes // len(posts) if posts else 0,
-            'avg_comments': total_comments // len(posts) if posts else 0,
-            'avg_reposts': total_reposts // len(posts) if posts else 0,
-            'avg_views': total_views // len(posts) if posts else 0,
-            'engagement_rate': round(avg_engagement, 2),
-            'total_reactions': total_likes + total_comments + total_reposts
+    except UpstreamError as e:
+        analytics = {
+            'available': False,
+            'message': f'Ошибка VK API: {str(e)}'
         }
-        
+        if e.not_found:
+            analytics['not_found'] = True
+        return analytics
     except Exception as e:
         return {
             'available': False,
             'message': f'Ошибка: {str(e)}'
         }
 
+def build_vk_analytics(group_info: Dict[str, Any], wall: Dict[str, Any]) -> Dict[str, Any]:
+    posts = wall.get('items', [])
+    
+    total_likes = sum(post.get('likes', {}).get('count', 0) for post in posts)
+    total_comments = sum(post.get('comments', {}).get('count', 0) for post in posts)
+    total_reposts = sum(post.get('reposts', {}).get('count', 0) for post in posts)
+    total_views = sum(post.get('views', {}).get('count', 0) for post in posts)
+    
+    avg_engagement = 0
+    if posts and group_info.get('members_count', 0) > 0:
+        total_engagement = total_likes + total_comments + total_reposts
+        avg_engagement = (total_engagement / len(posts) / group_info['members_count']) * 100
+    
+    return {
+        'available': True,
+        'platform': 'vk',
+        'subscribers': group_info.get('members_count', 0),
+        'posts_count': wall.get('count', 0),
+        'recent_posts': len(posts),
+        'avg_likes': total_likes // len(posts) if posts else 0,
+        'avg_comments': total_comments // len(posts) if posts else 0,
+        'avg_reposts': total_reposts // len(posts) if posts else 0,
+        'avg_views': total_views // len(posts) if posts else 0,
+        'engagement_rate': round(avg_engagement, 2),
+        'total_reactions': total_likes + total_comments + total_reposts
+    }
+
+VK_EXECUTE_MAX_CALLS = 25
+
+def match_vk_group(requested_id: str, groups_info: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    normalized = requested_id.strip().lower().lstrip('-')
+    for prefix in ('club', 'public', 'event'):
+        if normalized.startswith(prefix) and normalized[len(prefix):].isdigit():
+            normalized = normalized[len(prefix):]
+    for info in groups_info:
+        if str(info.get('id')) == normalized or str(info.get('screen_name', '')).lower() == normalized:
+            return info
+    return None
+
+def get_vk_analytics_batch(group_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    '''
+    Аналитика для нескольких групп VK: один groups.getById со списком ID
+    и по одному execute на каждые 25 стен вместо двух запросов на группу
+    '''
+    vk_token = os.environ.get('VK_API_TOKEN')
+    
+    if not vk_token:
+        return {gid: {'available': False, 'message': 'VK API токен не настроен'} for gid in group_ids}
+    
+    deadline = time.monotonic() + ANALYTICS_DEADLINE
+    
+    try:
+        groups_info = vk_request('groups.getById', {
+            'group_ids': ','.join(group_ids),
+            'fields': 'members_count,activity,description'
+        }, vk_token, deadline) or []
+        matched = {gid: match_vk_group(gid, groups_info) for gid in group_ids}
+        owners = list({info['id'] for info in matched.values() if info})
+        
+        walls: Dict[int, Dict[str, Any]] = {}
+        for start in range(0, len(owners), VK_EXECUTE_MAX_CALLS):
+            chunk = owners[start:start + VK_EXECUTE_MAX_CALLS]
+            code = 'return [' + ','.join(
+                f'API.wall.get({{"owner_id": -{owner}, "count": 10}})' for owner in chunk
+            ) + '];'
+            for owner, wall in zip(chunk, vk_request('execute', {'code': code}, vk_token, deadline, post=True) or []):
+                walls[owner] = wall or {}
+    except UpstreamError as e:
+        message = f'Ошибка VK API: {str(e)}'
+        if e.not_found and len(group_ids) == 1:
+            return {group_ids[0]: {'available': False, 'not_found': True, 'message': message}}
+        return {gid: {'available': False, 'message': message} for gid in group_ids}
+    except Exception as e:
+        return {gid: {'available': False, 'message': f'Ошибка: {str(e)}'} for gid in group_ids}
+    
+    results = {}
+    for gid, info in matched.items():
+        if not info:
+            results[gid] = {'available': False, 'not_found': True, 'message': 'Группа не найдена в VK'}
+        else:
+            results[gid] = build_vk_analytics(info, walls.get(info['id'], {}))
+    return results
+
+def get_telegram_analytics_batch(channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    # Отдельный пул: задачи внутри get_telegram_analytics сами ждут upstream-пул
+    with ThreadPoolExecutor(max_workers=min(8, len(channel_ids)) or 1) as executor:
+        futures = [submit_traced(executor, get_telegram_analytics, channel_id) for channel_id in channel_ids]
+        return {channel_id: future.result() for channel_id, future in zip(channel_ids, futures)}
+
 def get_telegram_analytics(channel_id: str) -> Dict[str, Any]:
     tgstat_token = os.environ.get('TGSTAT_API_TOKEN')
     
@@ -351,124 +2538,447 @@ def get_telegram_analytics(channel_id: str) -> Dict[str, Any]:
             'message': 'TGStat API токен не настроен'
         }
     
+    deadline = time.monotonic() + ANALYTICS_DEADLINE
+    
     try:
         if channel_id.startswith('@'):
             channel_id = channel_id[1:]
         
-        response = requests.get(
-            f'https://api.tgstat.ru/channels/get',
-            params={
-                'token': tgstat_token,
-                'channelId': channel_id
-            },
-            timeout=10
-        )
-        
-        data = response.json()
+        channel_info = tgstat_request('channels/get', {'channelId': channel_id}, tgstat_token, deadline) or {}
+    except UpstreamError as e:
+        analytics = {
+            'available': False,
+            'message': f"Ошибка TGStat API: {str(e)}"
+        }
+        if e.not_found:
+            analytics['not_found'] = True
+        return analytics
+    except Exception as e:
+        return {
+            'available': False,
+            'message': f"Ошибка TGStat API: {str(e)}"
+        }
+    
+    sub_requests = {
+        'stats': ('channels/stat', {'channelId': channel_id}),
+        'posts': ('channels/posts', {'channelId': channel_id, 'limit': 10}),
+        'subscribers': ('channels/subscribers', {'channelId': channel_id}),
+        'views': ('channels/views', {'channelId': channel_id})
+    }
+    futures = {
+        name: submit_traced(get_upstream_executor(), tgstat_request, method, params, tgstat_token, deadline)
+        for name, (method, params) in sub_requests.items()
+    }
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            errors[name] = 'Превышено время ожидания'
+        except Exception as e:
+            errors[name] = str(e)
+    
+    stats = results.get('stats') or {}
+    posts = (results.get('posts') or {}).get('items', [])
+    
+    avg_views = 0
+    avg_forwards = 0
+    if posts:
+        total_views = sum(post.get('views', 0) for post in posts)
+        total_forwards = sum(post.get('forwards', 0) for post in posts)
+        avg_views = total_views // len(posts)
+        avg_forwards = total_forwards // len(posts)
+    
+    participants = channel_info.get('participants_count', 0)
+    err = 0
+    if participants > 0 and avg_views > 0:
+        err = (avg_views / participants) * 100
+    
+    subscribers_history = []
+    for item in (results.get('subscribers') or [])[-30:]:
+        subscribers_history.append({
+            'date': item.get('period'),
+            'subscribers': item.get('participants_count', 0)
+        })
+    
+    views_history = []
+    for item in (results.get('views') or [])[-30:]:
+        views_history.append({
+            'date': item.get('period'),
+            'views': item.get('views_avg', 0)
+        })
+    
+    analytics = {
+        'available': True,
+        'platform': 'telegram',
+        'subscribers': participants,
+        'title': channel_info.get('title', ''),
+        'username': channel_info.get('username', ''),
+        'category': channel_info.get('category', ''),
+        'avg_post_reach': avg_views,
+        'avg_forwards': avg_forwards,
+        'err_percent': round(err, 2),
+        'daily_reach': stats.get('daily_reach', 0),
+        'posts_count': channel_info.get('posts_count', 0),
+        'mentions_count': stats.get('mentions_count', 0),
+        'subscribers_history': subscribers_history,
+        'views_history': views_history
+    }
+    if errors:
+        analytics['partial'] = True
+        analytics['errors'] = errors
+    return analytics
+
+ANALYTICS_DEEP_MAX_POSTS = int(os.environ.get('ANALYTICS_DEEP_MAX_POSTS', '2000'))
+ANALYTICS_DEEP_DEADLINE = float(os.environ.get('ANALYTICS_DEEP_DEADLINE', '25'))
+ANALYTICS_UTC_OFFSET_HOURS = int(os.environ.get('ANALYTICS_UTC_OFFSET_HOURS', '3'))
+ANALYTICS_TREND_WINDOW = 20
+ANALYTICS_TREND_POINTS = 60
+ANALYTICS_PERCENTILES = (50, 75, 90)
+VK_WALL_PAGE_SIZE = 100
+VK_POST_METRICS = ('likes', 'comments', 'reposts', 'views')
+TGSTAT_POSTS_PAGE_SIZE = 50
+TGSTAT_POST_METRICS = ('views', 'forwards')
+
+_numpy: Any = None
+_numpy_loaded = False
+
+def load_numpy() -> Any:
+    # NumPy нужен только глубокому анализу и не обязателен: без него считает чистый Python
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            _numpy = importlib.import_module('numpy')
+        except ImportError:
+            _numpy = None
+        _numpy_loaded = True
+    return _numpy
+
+def percentile_sorted(values: List[float], pct: float) -> float:
+    # Линейная интерполяция между соседями, как numpy.percentile по умолчанию
+    position = (len(values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def engagement_columns_numpy(numpy: Any, dates: List[int], columns: Dict[str, List[float]],
+                             engagement_keys: Tuple[str, ...], audience: int, window: int) -> Dict[str, Any]:
+    order = numpy.argsort(numpy.asarray(dates, dtype=numpy.int64), kind='stable')
+    times = numpy.asarray(dates, dtype=numpy.int64)[order]
+    names = list(columns)
+    matrix = numpy.asarray([columns[name] for name in names], dtype=numpy.float64)[:, order]
+    engagement = matrix[[names.index(key) for key in engagement_keys]].sum(axis=0)
+    rate = engagement * (100.0 / audience) if audience > 0 else numpy.zeros_like(engagement)
+    matrix = numpy.vstack([matrix, engagement, rate])
+    
+    summary = numpy.vstack([
+        matrix.mean(axis=1),
+        numpy.percentile(matrix, ANALYTICS_PERCENTILES, axis=1),
+        matrix.max(axis=1)
+    ]).T
+    local = times + ANALYTICS_UTC_OFFSET_HOURS * 3600
+    # 1 января 1970 - четверг, отсюда сдвиг на 3 для понедельника = 0
+    weekday = (local // 86400 + 3) % 7
+    hour = local // 3600 % 24
+    cumulative = numpy.concatenate(([0.0], numpy.cumsum(rate)))
+    return {
+        'dates': times.tolist(),
+        'summary': summary.tolist(),
+        'weekday': [numpy.bincount(weekday, weights=weights, minlength=7).tolist() for weights in (None, engagement, rate)],
+        'hour': [numpy.bincount(hour, weights=weights, minlength=24).tolist() for weights in (None, engagement, rate)],
+        'rolling': ((cumulative[window:] - cumulative[:-window]) / window).tolist()
+    }
+
+def engagement_columns_python(dates: List[int], columns: Dict[str, List[float]],
+                              engagement_keys: Tuple[str, ...], audience: int, window: int) -> Dict[str, Any]:
+    order = sorted(range(len(dates)), key=dates.__getitem__)
+    times = [int(dates[i]) for i in order]
+    names = list(columns)
+    matrix = [[float(columns[name][i]) for i in order] for name in names]
+    engagement = [sum(values) for values in zip(*(matrix[names.index(key)] for key in engagement_keys))]
+    rate = [value * 100.0 / audience for value in engagement] if audience > 0 else [0.0] * len(engagement)
+    matrix += [engagement, rate]
+    
+    summary = []
+    for values in matrix:
+        ordered = sorted(values)
+        summary.append([
+            sum(values) / len(values),
+            *(percentile_sorted(ordered, pct) for pct in ANALYTICS_PERCENTILES),
+            ordered[-1]
+        ])
+    
+    offset = ANALYTICS_UTC_OFFSET_HOURS * 3600
+    weekday = [[0] * 7, [0.0] * 7, [0.0] * 7]
+    hour = [[0] * 24, [0.0] * 24, [0.0] * 24]
+    for moment, value, value_rate in zip(times, engagement, rate):
+        for groups, key in ((weekday, ((moment + offset) // 86400 + 3) % 7), (hour, (moment + offset) // 3600 % 24)):
+            groups[0][key] += 1
+            groups[1][key] += value
+            groups[2][key] += value_rate
+    
+    rolling = []
+    running = sum(rate[:window])
+    rolling.append(running / window)
+    for i in range(window, len(rate)):
+        running += rate[i] - rate[i - window]
+        rolling.append(running / window)
+    return {'dates': times, 'summary': summary, 'weekday': weekday, 'hour': hour, 'rolling': rolling}
+
+def local_date(moment: int) -> str:
+    return datetime.fromtimestamp(moment + ANALYTICS_UTC_OFFSET_HOURS * 3600, timezone.utc).date().isoformat()
+
+def grouped_engagement(groups: List[List[float]], key_name: str) -> List[Dict[str, Any]]:
+    counts, engagement, rate = groups
+    return [
+        {
+            key_name: key,
+            'posts': int(count),
+            'avg_engagement': round(engagement[key] / count, 1) if count else 0,
+            'avg_engagement_rate': round(rate[key] / count, 3) if count else 0
+        }
+        for key, count in enumerate(counts)
+    ]
+
+def build_engagement_analysis(dates: List[int], columns: Dict[str, List[float]],
+                              engagement_keys: Tuple[str, ...], audience: int) -> Dict[str, Any]:
+    '''
+    Статистика вовлечённости по постам в колоночном виде: dates - unix-время,
+    columns - счётчики метрик в том же порядке. Вовлечённость поста - сумма
+    engagement_keys, engagement_rate - она же в процентах от аудитории.
+    С NumPy всё считается векторно над матрицей метрик, без него - тем же
+    алгоритмом на списках; результаты совпадают.
+    '''
+    if not dates:
+        return {'posts_analyzed': 0}
+    window = min(ANALYTICS_TREND_WINDOW, len(dates))
+    numpy = load_numpy()
+    with trace_span('analyze', f"{'numpy' if numpy is not None else 'python'} {len(dates)}"):
+        if numpy is not None:
+            stats = engagement_columns_numpy(numpy, dates, columns, engagement_keys, audience, window)
+        else:
+            stats = engagement_columns_python(dates, columns, engagement_keys, audience, window)
+    
+    fields = ['avg', *('median' if pct == 50 else f'p{pct}' for pct in ANALYTICS_PERCENTILES), 'max']
+    metrics = {
+        name: {field: round(value, 3 if name == 'engagement_rate' else 1) for field, value in zip(fields, row)}
+        for name, row in zip([*columns, 'engagement', 'engagement_rate'], stats['summary'])
+    }
+    by_weekday = grouped_engagement(stats['weekday'], 'weekday')
+    by_hour = grouped_engagement(stats['hour'], 'hour')
+    
+    rolling = stats['rolling']
+    step = max(1, -(-len(rolling) // ANALYTICS_TREND_POINTS))
+    trend = [
+        {'date': local_date(stats['dates'][i + window - 1]), 'engagement_rate': round(rolling[i], 3)}
+        for i in reversed(range(len(rolling) - 1, -1, -step))
+    ]
+    trend_change = (rolling[-1] - rolling[0]) / rolling[0] * 100 if rolling[0] else 0
+    
+    active_weekdays = [item for item in by_weekday if item['posts']]
+    active_hours = [item for item in by_hour if item['posts']]
+    return {
+        'posts_analyzed': len(dates),
+        'period': {'from': local_date(stats['dates'][0]), 'to': local_date(stats['dates'][-1])},
+        'engagement_metric': '+'.join(engagement_keys),
+        'metrics': metrics,
+        'by_weekday': by_weekday,
+        'by_hour': by_hour,
+        'best_weekday': max(active_weekdays, key=lambda item: item['avg_engagement_rate'])['weekday'],
+        'best_hour': max(active_hours, key=lambda item: item['avg_engagement_rate'])['hour'],
+        'trend_window': window,
+        'trend': trend,
+        'trend_change_percent': round(trend_change, 1),
+        'engine': 'numpy' if numpy is not None else 'python'
+    }
+
+def post_columns(posts: List[Dict[str, Any]], metrics: Tuple[str, ...]) -> Tuple[List[int], Dict[str, List[float]]]:
+    # В VK счётчики - объекты {'count': N}, в TGStat - числа
+    dates = [post.get('date', 0) for post in posts]
+    columns = {
+        metric: [
+            (value.get('count', 0) if isinstance(value, dict) else value) or 0
+            for value in (post.get(metric) for post in posts)
+        ]
+        for metric in metrics
+    }
+    return dates, columns
+
+def fetch_vk_wall_posts(owner_id: int, token: str, deadline: float, limit: int) -> Tuple[int, List[Dict[str, Any]], bool]:
+    '''
+    Стена группы страницами по VK_WALL_PAGE_SIZE: первая - обычным wall.get
+    (заодно даёт общее число постов), остальные - по VK_EXECUTE_MAX_CALLS
+    страниц в одном execute. Если время или лимиты кончились на середине,
+    возвращает то, что успело прийти, с complete=False.
+    '''
+    first = vk_request('wall.get', {'owner_id': f'-{owner_id}', 'count': VK_WALL_PAGE_SIZE}, token, deadline) or {}
+    total = first.get('count', 0)
+    posts = list(first.get('items', []))
+    offsets = list(range(VK_WALL_PAGE_SIZE, min(total, limit), VK_WALL_PAGE_SIZE))
+    complete = True
+    for start in range(0, len(offsets), VK_EXECUTE_MAX_CALLS):
+        chunk = offsets[start:start + VK_EXECUTE_MAX_CALLS]
+        code = 'return [' + ','.join(
+            f'API.wall.get({{"owner_id": -{owner_id}, "offset": {offset}, "count": {VK_WALL_PAGE_SIZE}}})'
+            for offset in chunk
+        ) + '];'
+        try:
+            pages = vk_request('execute', {'code': code}, token, deadline, post=True) or []
+        except (UpstreamError, TimeoutError):
+            complete = False
+            break
+        for page in pages:
+            posts.extend((page or {}).get('items', []))
+    # Закреплённый пост приходит первым на первой странице и может повториться дальше
+    unique = {post['id']: post for post in posts if 'id' in post}
+    return total, list(unique.values())[:limit], complete
+
+def get_vk_deep_analytics(group_id: str) -> Dict[str, Any]:
+    vk_token = os.environ.get('VK_API_TOKEN')
+    
+    if not vk_token:
+        return {
+            'available': False,
+            'message': 'VK API токен не настроен'
+        }
+    
+    deadline = time.monotonic() + ANALYTICS_DEEP_DEADLINE
+    
+    try:
+        groups_info = vk_request('groups.getById', {
+            'group_id': group_id,
+            'fields': 'members_count'
+        }, vk_token, deadline)
         
-        if data.get('status') != 'ok':
+        if not groups_info:
             return {
                 'available': False,
-                'message': f"Ошибка TGStat API: {data.get('error', 'Unknown')}"
+                'not_found': True,
+                'message': 'Группа не найдена в VK'
             }
         
-        channel_info = data.get('response', {})
-        
-        stats_response = requests.get(
-            f'https://api.tgstat.ru/channels/stat',
-            params={
-                'token': tgstat_token,
-                'channelId': channel_id
-            },
-            timeout=10
-        )
-        
-        stats_data = stats_response.json()
-        stats = stats_data.get('response', {}) if stats_data.get('status') == 'ok' else {}
-        
-        posts_response = requests.get(
-            f'https://api.tgstat.ru/channels/posts',
-            params={
-                'token': tgstat_token,
-                'channelId': channel_id,
-                'limit': 10
-            },
-            timeout=10
-        )
-        
-        posts_data = posts_response.json()
-        posts = posts_data.get('response', {}).get('items', []) if posts_data.get('status') == 'ok' else []
-        
-        avg_views = 0
-        avg_forwards = 0
-        if posts:
-            total_views = sum(post.get('views', 0) for post in posts)
-            total_forwards = sum(post.get('forwards', 0) for post in posts)
-            avg_views = total_views // len(posts)
-            avg_forwards = total_forwards // len(posts)
-        
-        participants = channel_info.get('participants_count', 0)
-        err = 0
-        if participants > 0 and avg_views > 0:
-            err = (avg_views / participants) * 100
-        
-        history_response = requests.get(
-            f'https://api.tgstat.ru/channels/subscribers',
-            params={
-                'token': tgstat_token,
-                'channelId': channel_id
-            },
-            timeout=10
-        )
-        
-        history_data = history_response.json()
-        subscribers_history = []
-        if history_data.get('status') == 'ok':
-            raw_history = history_data.get('response', [])
-            for item in raw_history[-30:]:
-                subscribers_history.append({
-                    'date': item.get('period'),
-                    'subscribers': item.get('participants_count', 0)
-                })
-        
-        views_response = requests.get(
-            f'https://api.tgstat.ru/channels/views',
-            params={
-                'token': tgstat_token,
-                'channelId': channel_id
-            },
-            timeout=10
+        group_info = groups_info[0]
+        total, posts, complete = fetch_vk_wall_posts(group_info['id'], vk_token, deadline, ANALYTICS_DEEP_MAX_POSTS)
+    except UpstreamError as e:
+        analytics = {
+            'available': False,
+            'message': f'Ошибка VK API: {str(e)}'
+        }
+        if e.not_found:
+            analytics['not_found'] = True
+        return analytics
+    except Exception as e:
+        return {
+            'available': False,
+            'message': f'Ошибка: {str(e)}'
+        }
+    
+    subscribers = group_info.get('members_count', 0)
+    dates, columns = post_columns(posts, VK_POST_METRICS)
+    analytics = {
+        'available': True,
+        'platform': 'vk',
+        'deep': True,
+        'subscribers': subscribers,
+        'posts_count': total,
+        **build_engagement_analysis(dates, columns, ('likes', 'comments', 'reposts'), subscribers)
+    }
+    if not complete:
+        analytics['partial'] = True
+    return analytics
+
+def fetch_telegram_posts(channel_id: str, token: str, deadline: float, limit: int) -> Tuple[int, List[Dict[str, Any]], bool]:
+    '''
+    Посты канала страницами по TGSTAT_POSTS_PAGE_SIZE: первая страница даёт
+    total_count, остальные запрашиваются параллельно через upstream-пул,
+    темп задаёт общий token bucket TGStat
+    '''
+    first = tgstat_request('channels/posts', {'channelId': channel_id, 'limit': TGSTAT_POSTS_PAGE_SIZE}, token, deadline) or {}
+    total = first.get('total_count') or first.get('count') or 0
+    posts = list(first.get('items', []))
+    futures = [
+        submit_traced(
+            get_upstream_executor(), tgstat_request, 'channels/posts',
+            {'channelId': channel_id, 'limit': TGSTAT_POSTS_PAGE_SIZE, 'offset': offset}, token, deadline
         )
-        
-        views_data = views_response.json()
-        views_history = []
-        if views_data.get('status') == 'ok':
-            raw_views = views_data.get('response', [])
-            for item in raw_views[-30:]:
-                views_history.append({
-                    'date': item.get('period'),
-                    'views': item.get('views_avg', 0)
-                })
-        
+        for offset in range(TGSTAT_POSTS_PAGE_SIZE, min(total, limit), TGSTAT_POSTS_PAGE_SIZE)
+    ]
+    complete = True
+    for future in futures:
+        try:
+            posts.extend((future.result(timeout=max(0.0, deadline - time.monotonic())) or {}).get('items', []))
+        except FutureTimeoutError:
+            future.cancel()
+            complete = False
+        except Exception:
+            complete = False
+    unique = {post['id']: post for post in posts if 'id' in post}
+    return total, list(unique.values())[:limit], complete
+
+def get_telegram_deep_analytics(channel_id: str) -> Dict[str, Any]:
+    tgstat_token = os.environ.get('TGSTAT_API_TOKEN')
+    
+    if not tgstat_token:
         return {
-            'available': True,
-            'platform': 'telegram',
-            'subscribers': participants,
-            'title': channel_info.get('title', ''),
-            'username': channel_info.get('username', ''),
-            'category': channel_info.get('category', ''),
-            'avg_post_reach': avg_views,
-            'avg_forwards': avg_forwards,
-            'err_percent': round(err, 2),
-            'daily_reach': stats.get('daily_reach', 0),
-            'posts_count': channel_info.get('posts_count', 0),
-            'mentions_count': stats.get('mentions_count', 0),
-            'subscribers_history': subscribers_history,
-            'views_history': views_history
+            'available': False,
+            'message': 'TGStat API токен не настроен'
         }
-        
+    
+    deadline = time.monotonic() + ANALYTICS_DEEP_DEADLINE
+    channel_id = channel_id.removeprefix('@')
+    
+    try:
+        channel_info = tgstat_request('channels/get', {'channelId': channel_id}, tgstat_token, deadline) or {}
+        total, posts, complete = fetch_telegram_posts(channel_id, tgstat_token, deadline, ANALYTICS_DEEP_MAX_POSTS)
+    except UpstreamError as e:
+        analytics = {
+            'available': False,
+            'message': f"Ошибка TGStat API: {str(e)}"
+        }
+        if e.not_found:
+            analytics['not_found'] = True
+        return analytics
     except Exception as e:
         return {
             'available': False,
-            'message': f'Ошибка: {str(e)}'
-        }
\ No newline at end of file
+            'message': f"Ошибка TGStat API: {str(e)}"
+        }
+    
+    participants = channel_info.get('participants_count', 0)
+    dates, columns = post_columns(posts, TGSTAT_POST_METRICS)
+    # Для каналов вовлечённость - охват поста: engagement_rate совпадает с ERR
+    analytics = {
+        'available': True,
+        'platform': 'telegram',
+        'deep': True,
+        'subscribers': participants,
+        'title': channel_info.get('title', ''),
+        'posts_count': channel_info.get('posts_count', total),
+        **build_engagement_analysis(dates, columns, ('views',), participants)
+    }
+    if not complete:
+        analytics['partial'] = True
+    return analytics
+
+def get_cached_deep_analytics(group_data: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Глубокий анализ кэшируется в analytics_cache рядом с обычной аналитикой,
+    под ключом канала с суффиксом DEEP_ANALYTICS_SUFFIX и на ANALYTICS_DEEP_TTL
+    (неполный - на ANALYTICS_DEEP_PARTIAL_TTL)
+    '''
+    if group_data['platform'] == 'vk' and group_data['vk_group_id']:
+        vk_group_id = group_data['vk_group_id']
+        return get_cached_analytics(
+            'vk', vk_group_id + DEEP_ANALYTICS_SUFFIX, lambda: get_vk_deep_analytics(vk_group_id)
+        )
+    if group_data['platform'] == 'telegram' and group_data['telegram_channel_id']:
+        channel_id = group_data['telegram_channel_id']
+        return get_cached_analytics(
+            'telegram', channel_id + DEEP_ANALYTICS_SUFFIX, lambda: get_telegram_deep_analytics(channel_id)
+        )
+    return {
+        'available': False,
+        'message': 'Статистика недоступна - не указан ID группы'
+    }
@@ -4,18 +4,1097 @@ Args: event с httpMethod, queryStringParameters, body; context с request_id
 Returns: HTTP response с данными отзывов
 '''
 
+import base64
+import gzip
+import hashlib
+import hmac
+import importlib
+import io
 import json
 import os
-from typing import Dict, Any
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from json.encoder import encode_basestring
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Инфраструктура (трассировка, пул и реплики, prepared statements, HTTP-кэш,
+# потоковый JSON, сжатие, handler) одинакова в backend/groups/index.py и
+# backend/reviews/index.py: каждая папка backend/<name> деплоится отдельной
+# функцией, и общий модуль вне неё в функцию не попадёт. Правка вносится в оба
+# файла; python bench/check_shared.py падает, если определения разошлись
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', '').lower() in ('1', 'true')
+TRACE_HEADER_MAX_SPANS = 30
+
+class RequestTrace:
+    '''
+    Спаны одного запроса: подключение к БД, SQL, внешние вызовы, кодирование JSON.
+    Включается TRACE_ENABLED; выключенная трассировка не подменяет курсоры
+    '''
+
+    def __init__(self, request_id: Optional[str]):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, detail: str = '') -> None:
+        finished = time.perf_counter()
+        with self._lock:
+            self.spans.append((name, started - self.started, finished - started, detail))
+
+    def server_timing(self) -> str:
+        entries = []
+        for name, _, duration, detail in self.spans[:TRACE_HEADER_MAX_SPANS]:
+            entry = f'{name};dur={duration * 1000:.2f}'
+            if detail:
+                desc = ' '.join(detail.split())[:60].replace('"', "'").replace('\\', '/')
+                desc = desc.encode('ascii', 'replace').decode()
+                entry += f';desc="{desc}"'
+            entries.append(entry)
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries)
+
+    def log(self, event: Dict[str, Any], status: int) -> None:
+        print(json.dumps({
+            'request_id': self.request_id,
+            'method': event.get('httpMethod'),
+            'params': event.get('queryStringParameters') or {},
+            'status': status,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'spans': [
+                {'name': name, 'start_ms': round(start * 1000, 2),
+                 'duration_ms': round(duration * 1000, 2), 'detail': detail}
+                for name, start, duration, detail in self.spans
+            ]
+        }, ensure_ascii=False), flush=True)
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('current_trace', default=None)
+
+@contextmanager
+def trace_span(name: str, detail: str = '') -> Iterator[None]:
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, started, detail)
+
+def normalize_sql(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())
+
+class TracingDictCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        with trace_span('sql', normalize_sql(query)):
+            return super().execute(query, vars)
+
+class TracingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        with trace_span('sql', normalize_sql(query)):
+            return super().execute(query, vars)
+
+    def fetchmany(self, size=None):
+        with trace_span('sql-fetch'):
+            return super().fetchmany(size)
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() in ('1', 'true')
+
+class PreparingConnection(psycopg2.extensions.connection):
+    # Имена запросов, уже подготовленных в сессии: PREPARE живёт до закрытия соединения
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: set = set()
+        self.prepared_stale = False
+
+SQL_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+
+_prepared_queries: Dict[str, Tuple[str, str, str]] = {}
+
+def prepare_query(query: str) -> Tuple[str, str, str]:
+    '''
+    Переводит запрос с плейсхолдерами psycopg2 (%s или %(name)s) в текст для
+    PREPARE с $1, $2, ... и строку EXECUTE с теми же плейсхолдерами.
+    Имя выводится из текста запроса, результат кешируется на процесс.
+    '''
+    cached = _prepared_queries.get(query)
+    if cached:
+        return cached
+    names: List[str] = []
+    positional = 0
+    
+    def replace(match) -> str:
+        nonlocal positional
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1):
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f'${names.index(match.group(1)) + 1}'
+        positional += 1
+        return f'${positional}'
+    
+    statement = SQL_PLACEHOLDER.sub(replace, query)
+    placeholders = [f'%({name})s' for name in names] or ['%s'] * positional
+    name = 'q_' + hashlib.md5(query.encode()).hexdigest()[:16]
+    execute = f"EXECUTE {name} ({', '.join(placeholders)})" if placeholders else f'EXECUTE {name}'
+    cached = _prepared_queries[query] = (name, statement, execute)
+    return cached
+
+def execute_prepared(cur, query: str, args: Any = None) -> None:
+    '''
+    Выполняет фиксированный запрос через серверный prepared statement: на тёплом
+    соединении Postgres не разбирает и не планирует его заново. Без PreparingConnection
+    или с DB_PREPARED_STATEMENTS=false (PgBouncer в transaction mode) - обычный execute.
+    '''
+    prepared = getattr(cur.connection, 'prepared_statements', None)
+    if not DB_PREPARED_STATEMENTS or prepared is None:
+        cur.execute(query, args)
+        return
+    conn = cur.connection
+    if conn.prepared_stale:
+        cur.execute('DEALLOCATE ALL')
+        prepared.clear()
+        conn.prepared_stale = False
+    name, statement, execute = prepare_query(query)
+    if name not in prepared:
+        cur.execute(f'PREPARE {name} AS {statement}')
+        prepared.add(name)
+    try:
+        cur.execute(execute, args)
+    except psycopg2.Error as e:
+        # После миграции план с другим набором колонок не выполняется (0A000):
+        # запросы сессии подготавливаются заново при следующем обращении
+        if e.pgcode == '0A000':
+            conn.prepared_stale = True
+        raise
+
+class PoolExhaustedError(psycopg2.OperationalError):
+    pass
+
+class ConnectionPool:
+    '''
+    Пул соединений уровня модуля: переживает вызовы в тёплом контейнере,
+    проверяет соединение при выдаче и закрывает простаивающие дольше idle_timeout
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.stats = {'connects': 0, 'reuses': 0, 'discarded': 0, 'evicted': 0}
+
+    def acquire(self, blocking: bool = True):
+        acquired = self._slots.acquire(timeout=DB_POOL_TIMEOUT) if blocking else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolExhaustedError('Connection pool exhausted')
+        try:
+            while True:
+                with self._lock:
+                    self._evict_idle(time.monotonic())
+                    if not self._idle:
+                        break
+                    conn, last_used = self._idle.pop()
+                if self._is_healthy(conn, time.monotonic() - last_used):
+                    self._count('reuses')
+                    return conn
+                self._close(conn)
+                self._count('discarded')
+            conn = psycopg2.connect(
+                self.dsn,
+                connection_factory=PreparingConnection,
+                cursor_factory=TracingDictCursor if TRACE_ENABLED else RealDictCursor
+            )
+            self._count('connects')
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        try:
+            if conn.closed:
+                return
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._close(conn)
+                self._count('discarded')
+                return
+            with self._lock:
+                now = time.monotonic()
+                self._evict_idle(now)
+                self._idle.append((conn, now))
+        finally:
+            self._slots.release()
+
+    def stats_header(self) -> str:
+        total = self.stats['connects'] + self.stats['reuses']
+        hit_rate = self.stats['reuses'] / total if total else 0
+        return (f"connects={self.stats['connects']}, reuses={self.stats['reuses']}, "
+                f"discarded={self.stats['discarded']}, evicted={self.stats['evicted']}, "
+                f"hit_rate={hit_rate:.2f}")
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if idle_for < DB_POOL_HEALTHCHECK_AFTER:
+            return True
+        try:
+            with conn.cursor() as check:
+                check.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict_idle(self, now: float) -> None:
+        fresh = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                self._close(conn)
+                self.stats['evicted'] += 1
+            else:
+                fresh.append((conn, last_used))
+        self._idle = fresh
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+_db_pool: Optional[ConnectionPool] = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool() -> ConnectionPool:
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT
+                )
+    return _db_pool
+
+RATING_STATS_UPSERT = '''
+    INSERT INTO group_rating_stats (
+        group_id, reviews_count, rating_sum,
+        rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (group_id) DO UPDATE SET
+        reviews_count = group_rating_stats.reviews_count + EXCLUDED.reviews_count,
+        rating_sum = group_rating_stats.rating_sum + EXCLUDED.rating_sum,
+        rating_1_count = group_rating_stats.rating_1_count + EXCLUDED.rating_1_count,
+        rating_2_count = group_rating_stats.rating_2_count + EXCLUDED.rating_2_count,
+        rating_3_count = group_rating_stats.rating_3_count + EXCLUDED.rating_3_count,
+        rating_4_count = group_rating_stats.rating_4_count + EXCLUDED.rating_4_count,
+        rating_5_count = group_rating_stats.rating_5_count + EXCLUDED.rating_5_count,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+def add_to_rating_stats(cur, group_id: int, histogram: List[int]) -> None:
+    '''
+    histogram - количество новых оценок 1..5 (индекс 0 соответствует оценке 1)
+    '''
+    reviews_count = sum(histogram)
+    rating_sum = sum((i + 1) * count for i, count in enumerate(histogram))
+    execute_prepared(cur, RATING_STATS_UPSERT, (group_id, reviews_count, rating_sum, *histogram))
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '5000'))
+OUTBOX_DRAIN_SECONDS = float(os.environ.get('OUTBOX_DRAIN_SECONDS', '20'))
+OUTBOX_BATCH_MAX = 50000
+OUTBOX_RETENTION_DAYS = 7
+
+def parse_outbox_batch_size(value: Optional[str]) -> int:
+    if not value:
+        return OUTBOX_BATCH_SIZE
+    try:
+        batch_size = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if batch_size < 1 or batch_size > OUTBOX_BATCH_MAX:
+        raise ValueError(f'limit must be between 1 and {OUTBOX_BATCH_MAX}')
+    return batch_size
+
+def drain_review_outbox(cur, batch_size: int) -> Dict[str, int]:
+    '''
+    Один шаг воркера: забирает пачку необработанных событий из review_outbox,
+    применяет их к group_rating_stats, сбрасывает версии кэша групп и отзывов
+    и помечает события обработанными - всё в одной транзакции вызывающего.
+    SKIP LOCKED позволяет запускать воркеры параллельно.
+    '''
+    cur.execute(
+        '''SELECT id, group_id, rating FROM review_outbox
+           WHERE processed_at IS NULL
+           ORDER BY id
+           LIMIT %s
+           FOR UPDATE SKIP LOCKED''',
+        (batch_size,)
+    )
+    events = cur.fetchall()
+    if not events:
+        return {'processed': 0, 'groups': 0}
+    
+    histograms: Dict[int, List[int]] = {}
+    for event in events:
+        histograms.setdefault(event['group_id'], [0] * 5)[event['rating'] - 1] += 1
+    # Один порядок блокировок строк агрегатов у всех воркеров
+    for group_id in sorted(histograms):
+        add_to_rating_stats(cur, group_id, histograms[group_id])
+    
+    cur.execute(
+        'UPDATE review_outbox SET processed_at = now() WHERE id = ANY(%s)',
+        ([event['id'] for event in events],)
+    )
+    bump_resource_versions(cur, 'groups', 'reviews')
+    return {'processed': len(events), 'groups': len(histograms)}
+
+def purge_review_outbox(cur) -> int:
+    # Последнюю строку не трогаем: её id входит в ETag списка отзывов
+    cur.execute(
+        '''DELETE FROM review_outbox
+           WHERE processed_at < now() - make_interval(days => %s)
+             AND id < (SELECT MAX(id) FROM review_outbox)''',
+        (OUTBOX_RETENTION_DAYS,)
+    )
+    return cur.rowcount
+
+PAGE_LIMIT_DEFAULT = 20
+PAGE_LIMIT_MAX = 100
+
+REVIEW_SORTS = ('date', 'rating')
+REVIEW_FILTER_PARAMS = ('min_rating', 'max_rating', 'date_from', 'date_to', 'has_text', 'sort', 'order')
+
+def encode_cursor(row: Dict[str, Any], sort: str = 'date') -> str:
+    values = [row['created_at'].isoformat(), row['id']]
+    if sort == 'rating':
+        values.insert(0, row['rating'])
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, sort: str = 'date') -> Tuple[Any, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if sort == 'rating':
+            rating, created_at, review_id = values
+            return int(rating), datetime.fromisoformat(created_at), int(review_id)
+        created_at, review_id = values
+        return datetime.fromisoformat(created_at), int(review_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def parse_page_limit(value: Optional[str]) -> int:
+    if not value:
+        return PAGE_LIMIT_DEFAULT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > PAGE_LIMIT_MAX:
+        raise ValueError(f'limit must be between 1 and {PAGE_LIMIT_MAX}')
+    return limit
+
+def parse_date_bound(value: str, name: str, end: bool) -> datetime:
+    '''
+    Дата (YYYY-MM-DD) или дата со временем в ISO 8601. Голая дата в date_to
+    включает весь день, поэтому верхняя граница сдвигается на сутки.
+    '''
+    try:
+        if len(value) == 10:
+            bound = datetime.combine(date.fromisoformat(value), datetime.min.time())
+            return bound + timedelta(days=1) if end else bound
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date')
+
+def build_review_filters(params: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    '''
+    Условия WHERE по параметрам запроса. Оценка и дата проверяются по индексу
+    (group_id, rating, created_at), длина текста - уже по строке таблицы.
+    '''
+    conditions: List[str] = []
+    args: List[Any] = []
+    if params.get('group_id'):
+        conditions.append('r.group_id = %s')
+        args.append(int(params['group_id']))
+    
+    for name, operator in (('min_rating', '>='), ('max_rating', '<=')):
+        if params.get(name):
+            try:
+                rating = int(params[name])
+            except ValueError:
+                raise ValueError(f'{name} must be an integer')
+            if rating < 1 or rating > 5:
+                raise ValueError(f'{name} must be between 1 and 5')
+            conditions.append(f'r.rating {operator} %s')
+            args.append(rating)
+    
+    if params.get('date_from'):
+        conditions.append('r.created_at >= %s')
+        args.append(parse_date_bound(params['date_from'], 'date_from', False))
+    if params.get('date_to'):
+        conditions.append('r.created_at < %s')
+        args.append(parse_date_bound(params['date_to'], 'date_to', True))
+    
+    has_text = params.get('has_text')
+    if has_text:
+        if has_text == 'true':
+            min_length = 1
+        elif has_text.isdigit():
+            min_length = int(has_text)
+        else:
+            raise ValueError('has_text must be true or a minimum text length')
+        conditions.append("char_length(btrim(r.text)) >= %s")
+        args.append(min_length)
+    return conditions, args
+
+def parse_review_sort(params: Dict[str, Any]) -> Tuple[str, str]:
+    sort = params.get('sort') or 'date'
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(REVIEW_SORTS)}")
+    order = (params.get('order') or 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    return sort, order
+
+def fetch_reviews_page(cur, conditions: List[str], args: List[Any], limit: int,
+                       after: Optional[Tuple[Any, ...]], sort: str = 'date',
+                       order: str = 'desc') -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''
+    Keyset-пагинация по (created_at, id) или (rating, created_at, id):
+    стоимость страницы не зависит от её глубины
+    '''
+    keys = ['r.rating', 'r.created_at', 'r.id'] if sort == 'rating' else ['r.created_at', 'r.id']
+    conditions = list(conditions)
+    args = list(args)
+    if after:
+        comparison = '<' if order == 'desc' else '>'
+        conditions.append(f"({', '.join(keys)}) {comparison} ({', '.join(['%s'] * len(keys))})")
+        args.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    order_by = ', '.join(f'{key} {order.upper()}' for key in keys)
+    
+    execute_prepared(cur, f'''
+        SELECT r.*, g.name as group_name
+        FROM reviews r
+        JOIN groups g ON r.group_id = g.id
+        {where}
+        ORDER BY {order_by}
+        LIMIT %s
+    ''', (*args, limit + 1))
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], sort)
+    return [dict(r) for r in rows], next_cursor
+
+def fetch_review_histogram(cur, conditions: List[str], args: List[Any]) -> Dict[str, Any]:
+    '''
+    Распределение отзывов по оценкам и по дням одним проходом по индексу
+    (group_id, rating, created_at) через GROUPING SETS
+    '''
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur.execute(f'''
+        SELECT GROUPING(r.rating) as by_day, r.rating, r.created_at::date as day, COUNT(*) as count
+        FROM reviews r
+        {where}
+        GROUP BY GROUPING SETS ((r.rating), (r.created_at::date))
+    ''', args)
+    
+    ratings = {str(rating): 0 for rating in range(5, 0, -1)}
+    days = []
+    for row in cur.fetchall():
+        if row['by_day']:
+            days.append({'date': row['day'].isoformat(), 'count': row['count']})
+        else:
+            ratings[str(row['rating'])] = row['count']
+    days.sort(key=lambda item: item['date'])
+    return {'total': sum(ratings.values()), 'ratings': ratings, 'days': days}
+
+BULK_MAX_ROWS = 100000
+
+# Пределы varchar-колонок reviews: строка длиннее уронила бы COPY всего пакета
+# вместо ошибки в своей строке. text - TEXT, его длина не ограничивается
+REVIEW_STRING_FIELDS = ('user_name', 'user_avatar', 'text')
+REVIEW_FIELD_LIMITS = {'user_name': 255, 'user_avatar': 500}
+GROUP_ID_MAX = 2147483647
+
+def validate_review(data: Dict[str, Any]) -> Optional[str]:
+    group_id = data.get('group_id')
+    rating = data.get('rating', 0)
+    
+    if not group_id or not data.get('user_name') or not rating or not data.get('text'):
+        return 'group_id, user_name, rating and text are required'
+    
+    if isinstance(group_id, bool) or not str(group_id).isdigit() or int(group_id) > GROUP_ID_MAX:
+        return 'group_id must be an integer'
+    
+    if isinstance(rating, bool) or not isinstance(rating, int) or rating < 1 or rating > 5:
+        return 'Rating must be between 1 and 5'
+    
+    for field in REVIEW_STRING_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return f'{field} must be a string'
+        if '\x00' in value:
+            return f'{field} must not contain NUL characters'
+        limit = REVIEW_FIELD_LIMITS.get(field)
+        if limit and len(value) > limit:
+            return f'{field} must be at most {limit} characters'
+    
+    return None
+
+class InvalidLine:
+    # Строка NDJSON, которая не разобралась: номер строки тела и ошибка JSON
+    def __init__(self, line: int, error: json.JSONDecodeError):
+        self.line = line
+        self.message = f'Invalid JSON on line {line}, column {error.colno}: {error.msg}'
+
+def parse_bulk_body(event: Dict[str, Any]) -> List[Any]:
+    '''
+    Тело пакетной загрузки: JSON-массив отзывов или NDJSON (по отзыву на строку).
+    Строки NDJSON, которые не разбираются, возвращаются как InvalidLine и попадут в ошибки.
+    '''
+    raw = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        raw = base64.b64decode(raw).decode('utf-8')
+    
+    if raw.lstrip().startswith('['):
+        try:
+            rows = json.loads(raw)
+        except ValueError:
+            raise ValueError('Body is not a valid JSON array')
+    else:
+        rows = []
+        for number, line in enumerate(raw.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                rows.append(InvalidLine(number, e))
+    
+    if not rows:
+        raise ValueError('No reviews to import')
+    if len(rows) > BULK_MAX_ROWS:
+        raise ValueError(f'At most {BULK_MAX_ROWS} reviews per request')
+    return rows
+
+def copy_escape(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def ingest_reviews(cur, rows: List[Any]) -> Dict[str, Any]:
+    '''
+    Проверяет строки по тем же правилам, что и одиночный POST, и грузит
+    валидные одной командой COPY, а события для агрегатов - второй в review_outbox.
+    ID выделяются заранее из последовательности, поэтому каждой входной строке
+    сопоставляется её id без RETURNING.
+    '''
+    errors = []
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidLine):
+            errors.append({'row': index, 'line': row.line, 'error': row.message})
+            continue
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'Row is not a JSON object'})
+            continue
+        error = validate_review(row)
+        if error:
+            errors.append({'row': index, 'error': error})
+            continue
+        valid.append((index, {**row, 'group_id': int(row['group_id'])}))
+    
+    group_ids = list({row['group_id'] for _, row in valid})
+    cur.execute('SELECT id FROM groups WHERE id = ANY(%s)', (group_ids,))
+    known_groups = {row['id'] for row in cur.fetchall()}
+    accepted = []
+    for index, row in valid:
+        if row['group_id'] in known_groups:
+            accepted.append((index, row))
+        else:
+            errors.append({'row': index, 'error': 'Group not found'})
+    
+    ids: List[Optional[int]] = [None] * len(rows)
+    if accepted:
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('reviews', 'id')) as id FROM generate_series(1, %s)",
+            (len(accepted),)
+        )
+        new_ids = [row['id'] for row in cur.fetchall()]
+        
+        buffer = io.StringIO()
+        for review_id, (index, row) in zip(new_ids, accepted):
+            ids[index] = review_id
+            buffer.write('\t'.join(copy_escape(value) for value in (
+                review_id, row['group_id'], row['user_name'], row.get('user_avatar', ''),
+                row['rating'], row['text']
+            )))
+            buffer.write('\n')
+        buffer.seek(0)
+        cur.copy_expert(
+            'COPY reviews (id, group_id, user_name, user_avatar, rating, text) FROM STDIN',
+            buffer
+        )
+        
+        outbox = io.StringIO()
+        for review_id, (_, row) in zip(new_ids, accepted):
+            outbox.write(f"{review_id}\t{row['group_id']}\t{row['rating']}\n")
+        outbox.seek(0)
+        cur.copy_expert('COPY review_outbox (review_id, group_id, rating) FROM STDIN', outbox)
+    
+    errors.sort(key=lambda error: error['row'])
+    return {'inserted': len(accepted), 'ids': ids, 'errors': errors}
+
+DATABASE_REPLICA_URLS = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', '5'))
+
+class ReplicaSet:
+    '''
+    Реплики для чтения с round-robin. Отставание проверяется при выдаче соединения
+    не чаще раза в REPLICA_CHECK_INTERVAL; реплика с ошибкой или отставанием больше
+    REPLICA_MAX_LAG пропускается до следующей проверки. read_after - LSN последней
+    записи клиента: реплика, которая его ещё не доиграла, тоже пропускается.
+    '''
+
+    def __init__(self, dsns: List[str]):
+        self.pools = [ConnectionPool(dsn, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT) for dsn in dsns]
+        self._checked_at = [0.0] * len(dsns)
+        self._usable = [True] * len(dsns)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, read_after: Optional[str]) -> Optional[Tuple[Any, ConnectionPool]]:
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            check_due = time.monotonic() - self._checked_at[index] >= REPLICA_CHECK_INTERVAL
+            if not self._usable[index] and not check_due:
+                continue
+            pool = self.pools[index]
+            try:
+                conn = pool.acquire(blocking=False)
+            except PoolExhaustedError:
+                # Все соединения реплики заняты - это не сбой: она остаётся в ротации,
+                # а запрос без ожидания слота идёт на следующую реплику или на primary
+                continue
+            except psycopg2.Error:
+                self._mark(index, False)
+                continue
+            try:
+                if check_due:
+                    self._mark(index, self._lag(conn) <= REPLICA_MAX_LAG)
+                if self._usable[index] and (not read_after or self._has_replayed(conn, read_after)):
+                    return conn, pool
+            except psycopg2.Error:
+                self._mark(index, False)
+            pool.release(conn)
+        return None
+
+    def _mark(self, index: int, usable: bool) -> None:
+        with self._lock:
+            self._usable[index] = usable
+            self._checked_at[index] = time.monotonic()
+
+    def _lag(self, conn) -> float:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT COALESCE(CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                END, 0) as lag
+            ''')
+            return float(cur.fetchone()['lag'])
+
+    def _has_replayed(self, conn, lsn: str) -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                'SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, TRUE) as replayed',
+                (lsn,)
+            )
+            return cur.fetchone()['replayed']
+
+_replica_set: Optional[ReplicaSet] = None
+_connection_pools: Dict[int, ConnectionPool] = {}
+
+def get_replica_set() -> Optional[ReplicaSet]:
+    global _replica_set
+    if _replica_set is None and DATABASE_REPLICA_URLS:
+        with _db_pool_lock:
+            if _replica_set is None:
+                _replica_set = ReplicaSet(DATABASE_REPLICA_URLS)
+    return _replica_set
+
+def parse_lsn(value: Optional[str]) -> Optional[str]:
+    high, _, low = (value or '').partition('/')
+    try:
+        int(high, 16)
+        int(low, 16)
+    except ValueError:
+        return None
+    return value
+
+def get_read_connection(read_after: Optional[str] = None):
+    '''
+    Соединение для GET: с реплики, если они настроены и успевают, иначе с primary
+    '''
+    replicas = get_replica_set()
+    if replicas is not None:
+        with trace_span('db-acquire', 'replica'):
+            acquired = replicas.acquire(parse_lsn(read_after))
+        if acquired is not None:
+            conn, pool = acquired
+            with _db_pool_lock:
+                _connection_pools[id(conn)] = pool
+            return conn
+    return get_db_connection()
+
+def read_after_headers(cur) -> Dict[str, str]:
+    '''
+    LSN primary после записи: клиент передаёт его в ?read_after=,
+    и следующие чтения не уходят на реплику, которая записи ещё не видит
+    '''
+    if not DATABASE_REPLICA_URLS:
+        return {}
+    cur.execute('SELECT pg_current_wal_lsn()::text as lsn')
+    return {'X-Read-After': cur.fetchone()['lsn']}
+
 def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    with trace_span('db-acquire'):
+        return get_db_pool().acquire()
+
+def release_db_connection(conn) -> None:
+    with _db_pool_lock:
+        pool = _connection_pools.pop(id(conn), None)
+    (pool or get_db_pool()).release(conn)
+
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', '0'))
+LAST_MODIFIED_SETTLE = timedelta(seconds=2)
+
+def get_header(event: Dict[str, Any], name: str) -> str:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value or ''
+    return ''
+
+def get_resource_version(cur, resource: str) -> Tuple[str, Optional[datetime]]:
+    execute_prepared(cur, 'SELECT version, updated_at FROM cache_versions WHERE resource = %s', (resource,))
+    row = cur.fetchone()
+    if not row:
+        return f'W/"{resource}-0"', None
+    return f'W/"{resource}-{row["version"]}"', http_last_modified(row['updated_at'])
+
+def http_last_modified(updated_at: datetime) -> Optional[datetime]:
+    '''
+    Last-Modified с точностью до секунды. Пока секунда последней записи не
+    закончилась (с запасом LAST_MODIFIED_SETTLE на расхождение часов), заголовок
+    не отдаётся: запись в ту же секунду его бы не изменила, и If-Modified-Since
+    дал бы ложный 304. В это время клиент сверяется только по ETag.
+    '''
+    updated_at = updated_at.astimezone(timezone.utc)
+    if datetime.now(timezone.utc) - updated_at < LAST_MODIFIED_SETTLE:
+        return None
+    return updated_at.replace(microsecond=0)
+
+def get_reviews_version(cur) -> Tuple[str, Optional[datetime]]:
+    '''
+    Версия списка отзывов: счётчик из cache_versions плюс id последнего события
+    в review_outbox. Новый отзыв меняет ETag сразу, не дожидаясь воркера.
+    Версия групп входит тоже: в строках отзывов есть group_name.
+    '''
+    execute_prepared(cur, '''
+        SELECT v.version, g.version as groups_version, o.id as outbox_id,
+               GREATEST(v.updated_at, g.updated_at, o.created_at) as updated_at
+        FROM cache_versions v
+        JOIN cache_versions g ON g.resource = 'groups'
+        LEFT JOIN LATERAL (
+            SELECT id, created_at FROM review_outbox ORDER BY id DESC LIMIT 1
+        ) o ON TRUE
+        WHERE v.resource = 'reviews'
+    ''')
+    row = cur.fetchone()
+    if not row:
+        return 'W/"reviews-0"', None
+    return (
+        f'W/"reviews-{row["version"]}.{row["groups_version"]}.{row["outbox_id"] or 0}"',
+        http_last_modified(row['updated_at'])
+    )
+
+def bump_resource_versions(cur, *resources: str) -> None:
+    cur.execute(
+        '''UPDATE cache_versions
+           SET version = version + 1, updated_at = clock_timestamp()
+           WHERE resource = ANY(%s)''',
+        (sorted(resources),)
+    )
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    # Vary одинаковый у 200 и 304: кэш не сопоставит 304 с телом в другой кодировке
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate',
+        'Vary': 'Accept-Encoding'
+    }
+    if last_modified:
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+def is_not_modified(event: Dict[str, Any], etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in candidates]
+    
+    if_modified_since = get_header(event, 'If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            **cache_headers(etag, last_modified)
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '2000'))
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps_json(payload: Any) -> str:
+    with trace_span('encode'):
+        if orjson is not None:
+            return orjson.dumps(payload, default=json_default).decode()
+        return json.dumps(payload, default=json_default, ensure_ascii=False)
+
+def encode_json_value(value: Any) -> str:
+    value_type = type(value)
+    if value is None:
+        return 'null'
+    if value_type is str:
+        return encode_basestring(value)
+    if value_type is bool:
+        return 'true' if value else 'false'
+    if value_type is int:
+        return int.__repr__(value)
+    if value_type is float or value_type is Decimal:
+        return repr(float(value))
+    if value_type is datetime or value_type is date:
+        return '"' + value.isoformat() + '"'
+    return dumps_json(value)
+
+def stream_query_json(conn, query: str, args: Any = None) -> str:
+    '''
+    Выполняет запрос серверным (именованным) курсором и кодирует строки
+    кортежами порциями по STREAM_CHUNK_SIZE: ключи колонок готовятся один раз,
+    в памяти одновременно лежит только одна порция строк и растущий JSON
+    '''
+    started = time.perf_counter()
+    buffer = io.StringIO()
+    buffer.write('[')
+    cursor_factory = TracingCursor if TRACE_ENABLED else psycopg2.extensions.cursor
+    with conn.cursor(name='stream_rows', cursor_factory=cursor_factory) as cur:
+        cur.itersize = STREAM_CHUNK_SIZE
+        cur.execute(query, args)
+        keys: Optional[List[str]] = None
+        separator = ''
+        while True:
+            rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            if keys is None:
+                keys = [column.name for column in cur.description]
+                prefixes = ['{' + encode_basestring(keys[0]) + ':'] + [
+                    ',' + encode_basestring(key) + ':' for key in keys[1:]
+                ]
+            if orjson is not None:
+                chunk = orjson.dumps([dict(zip(keys, row)) for row in rows], default=json_default).decode()
+                buffer.write(separator + chunk[1:-1])
+            else:
+                for row in rows:
+                    buffer.write(separator)
+                    buffer.write(''.join(prefix + encode_json_value(value) for prefix, value in zip(prefixes, row)))
+                    buffer.write('}')
+                    separator = ','
+            separator = ','
+    buffer.write(']')
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add('stream', started)
+    return buffer.getvalue()
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', '3'))
+COMPRESSION_MODULES = {'br': 'brotli', 'zstd': 'zstandard'}
+
+_compressors: Dict[str, Any] = {}
+
+def load_compressor(encoding: str) -> Any:
+    # Модуль сжатия импортируется при первом большом ответе, а не на холодном старте
+    if encoding not in _compressors:
+        try:
+            _compressors[encoding] = importlib.import_module(COMPRESSION_MODULES[encoding])
+        except ImportError:
+            _compressors[encoding] = None
+    return _compressors[encoding]
+
+def available_encodings() -> List[str]:
+    # Порядок - предпочтение сервера при равных q у клиента
+    encodings = [encoding for encoding in ('br', 'zstd') if load_compressor(encoding) is not None]
+    encodings.append('gzip')
+    return encodings
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, options = part.partition(';')
+        quality = 1.0
+        options = options.strip()
+        if options.startswith('q='):
+            try:
+                quality = float(options[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    
+    best: Optional[Tuple[str, float]] = None
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+def compress_body(raw: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return load_compressor('br').compress(raw, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return load_compressor('zstd').ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Сжимает тело ответа по Accept-Encoding клиента: brotli или zstd, если
+    модули установлены, иначе gzip. Тела меньше COMPRESSION_MIN_SIZE байт
+    отдаются как есть. Сжатое тело возвращается в base64 с isBase64Encoded.
+    '''
+    body = response.get('body')
+    headers = response.setdefault('headers', {})
+    if response.get('isBase64Encoded') or not isinstance(body, str) or 'Content-Encoding' in headers:
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_SIZE:
+        return response
+    
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = negotiate_encoding(get_header(event, 'Accept-Encoding'))
+    if encoding is None:
+        return response
+    with trace_span('compress', encoding):
+        compressed = compress_body(raw, encoding)
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    headers['Content-Encoding'] = encoding
+    return response
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def is_admin_request(event: Dict[str, Any]) -> bool:
+    '''
+    Служебные POST-маршруты вызывает планировщик с заголовком X-Admin-Token.
+    Пока ADMIN_TOKEN не задан в окружении, они закрыты для всех.
+    '''
+    token = get_header(event, 'X-Admin-Token')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def forbidden_response() -> Dict[str, Any]:
+    return {
+        'statusCode': 403,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': 'Admin token required'}),
+        'isBase64Encoded': False
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    trace = RequestTrace(getattr(context, 'request_id', None)) if TRACE_ENABLED else None
+    token = _current_trace.set(trace)
+    try:
+        response = compress_response(event, handle_request(event, context))
+    finally:
+        _current_trace.reset(token)
+    headers = response.setdefault('headers', {})
+    if _db_pool is not None:
+        headers['X-DB-Pool'] = _db_pool.stats_header()
+    if trace is not None:
+        headers['Server-Timing'] = trace.server_timing()
+        trace.log(event, response.get('statusCode', 0))
+    exposed = [name for name in ('X-DB-Pool', 'Server-Timing', 'X-Read-After') if name in headers]
+    if exposed:
+        headers['Access-Control-Expose-Headers'] = ', '.join(exposed)
+    return response
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
+    params = event.get('queryStringParameters') or {}
     
     if method == 'OPTIONS':
         return {
@@ -30,13 +1109,83 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = get_db_connection()
+    conn = get_read_connection(params.get('read_after')) if method == 'GET' else get_db_connection()
     cur = conn.cursor()
     
     try:
         if method == 'GET':
-            params = event.get('queryStringParameters') or {}
+            etag, last_modified = get_reviews_version(cur)
+            if is_not_modified(event, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
             group_id = params.get('group_id', '')
+            if group_id and (not group_id.isdigit() or int(group_id) > GROUP_ID_MAX):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'group_id must be an integer'}),
+                    'isBase64Encoded': False
+                }
+            
+            if params.get('histogram') == 'true':
+                try:
+                    if not group_id.isdigit():
+                        raise ValueError('group_id is required for histogram')
+                    conditions, args = build_review_filters(params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        **cache_headers(etag, last_modified)
+                    },
+                    'body': dumps_json({'group_id': int(group_id), **fetch_review_histogram(cur, conditions, args)}),
+                    'isBase64Encoded': False
+                }
+            
+            if params.get('limit') or params.get('cursor') or any(params.get(name) for name in REVIEW_FILTER_PARAMS):
+                try:
+                    limit = parse_page_limit(params.get('limit'))
+                    sort, order = parse_review_sort(params)
+                    after = decode_cursor(params['cursor'], sort) if params.get('cursor') else None
+                    conditions, args = build_review_filters(params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+                
+                reviews, next_cursor = fetch_reviews_page(cur, conditions, args, limit, after, sort, order)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        **cache_headers(etag, last_modified)
+                    },
+                    'body': dumps_json({'reviews': reviews, 'next_cursor': next_cursor}),
+                    'isBase64Encoded': False
+                }
             
             if group_id:
                 query = '''
@@ -46,7 +1195,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE r.group_id = %s
                     ORDER BY r.created_at DESC
                 '''
-                cur.execute(query, (group_id,))
+                body = stream_query_json(conn, query, (int(group_id),))
             else:
                 query = '''
                     SELECT r.*, g.name as group_name
@@ -55,9 +1204,45 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     ORDER BY r.created_at DESC
                     LIMIT 50
                 '''
-                cur.execute(query)
+                body = stream_query_json(conn, query)
             
-            reviews = cur.fetchall()
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **cache_headers(etag, last_modified)
+                },
+                'body': body,
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'POST' and params.get('drain_outbox') == 'true':
+            if not is_admin_request(event):
+                return forbidden_response()
+            try:
+                batch_size = parse_outbox_batch_size(params.get('limit'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            deadline = time.monotonic() + OUTBOX_DRAIN_SECONDS
+            summary = {'processed': 0, 'batches': 0}
+            while time.monotonic() < deadline:
+                step = drain_review_outbox(cur, batch_size)
+                conn.commit()
+                summary['processed'] += step['processed']
+                summary['batches'] += 1
+                if step['processed'] < batch_size:
+                    break
+            summary['purged'] = purge_review_outbox(cur)
+            conn.commit()
             
             return {
                 'statusCode': 200,
@@ -65,44 +1250,68 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps([dict(r) for r in reviews], default=str),
+                'body': json.dumps({'success': True, **summary}),
                 'isBase64Encoded': False
             }
         
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            
-            group_id = body.get('group_id')
-            user_name = body.get('user_name', '')
-            user_avatar = body.get('user_avatar', '')
-            rating = body.get('rating', 0)
-            text = body.get('text', '')
-            
-            if not group_id or not user_name or not rating or not text:
+        elif method == 'POST' and params.get('bulk') == 'true':
+            try:
+                rows = parse_bulk_body(event)
+            except ValueError as e:
                 return {
                     'statusCode': 400,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'error': 'group_id, user_name, rating and text are required'}),
+                    'body': json.dumps({'error': str(e)}),
                     'isBase64Encoded': False
                 }
             
-            if rating < 1 or rating > 5:
+            result = ingest_reviews(cur, rows)
+            conn.commit()
+            
+            return {
+                'statusCode': 201 if result['inserted'] else 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **read_after_headers(cur)
+                },
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            
+            group_id = body.get('group_id')
+            user_name = body.get('user_name', '')
+            user_avatar = body.get('user_avatar', '')
+            rating = body.get('rating', 0)
+            text = body.get('text', '')
+            
+            error = validate_review(body)
+            if error:
                 return {
                     'statusCode': 400,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'error': 'Rating must be between 1 and 5'}),
+                    'body': json.dumps({'error': error}),
                     'isBase64Encoded': False
                 }
             
-            cur.execute(
-                '''INSERT INTO reviews (group_id, user_name, user_avatar, rating, text) 
-                   VALUES (%s, %s, %s, %s, %s) RETURNING id''',
+            execute_prepared(
+                cur,
+                '''WITH review AS (
+                       INSERT INTO reviews (group_id, user_name, user_avatar, rating, text) 
+                       VALUES (%s, %s, %s, %s, %s) RETURNING id, group_id, rating
+                   )
+                   INSERT INTO review_outbox (review_id, group_id, rating)
+                   SELECT id, group_id, rating FROM review
+                   RETURNING review_id as id''',
                 (group_id, user_name, user_avatar, rating, text)
             )
             review_id = cur.fetchone()['id']
@@ -112,7 +1321,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'statusCode': 201,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    **read_after_headers(cur)
                 },
                 'body': json.dumps({'id': review_id, 'message': 'Review created successfully'}),
                 'isBase64Encoded': False
@@ -130,4 +1340,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
@@ -0,0 +1,49 @@
+'''
+Проверка общей инфраструктуры функций: пул соединений, реплики, HTTP-кэш,
+сжатие, трассировка и prepared statements скопированы в backend/groups/index.py
+и backend/reviews/index.py, потому что каждая папка backend/<name> деплоится
+отдельной функцией и код вне неё в функцию не попадает.
+Сравнивает исходный текст всех определений верхнего уровня с одинаковым
+именем в обоих модулях и падает, если правку внесли только в один.
+Запуск: python bench/check_shared.py
+'''
+
+import ast
+import sys
+from pathlib import Path
+from typing import Dict
+
+# Без импорта common: проверке не нужен psycopg2
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = ('groups', 'reviews')
+
+# Определения, которые у функций свои и совпадать не должны
+OWN_DEFINITIONS = {'handle_request'}
+
+def top_level_definitions(path: Path) -> Dict[str, str]:
+    source = path.read_text()
+    definitions = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            name = node.name
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            name = node.target.id
+        else:
+            continue
+        definitions[name] = ast.get_source_segment(source, node)
+    return definitions
+
+def main() -> int:
+    first, second = (top_level_definitions(ROOT / 'backend' / name / 'index.py') for name in MODULES)
+    shared = [name for name in first if name in second and name not in OWN_DEFINITIONS]
+    drifted = [name for name in shared if first[name] != second[name]]
+    for name in drifted:
+        print(f'{name} differs between backend/{MODULES[0]}/index.py and backend/{MODULES[1]}/index.py', file=sys.stderr)
+    print(f'{len(shared) - len(drifted)} of {len(shared)} shared definitions match')
+    return 1 if drifted else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+'''
+Бенчмарк холодного старта: каждый прогон - новый процесс Python, который
+импортирует backend/<function>/index.py и вызывает handler() дважды.
+Печатает время импорта, первого (холодного) и второго (тёплого) запроса,
+самые дорогие импорты по -X importtime и модули, загруженные лениво.
+Запуск: BENCH_DATABASE_URL=postgresql://localhost/bench python bench/cold_start.py --runs 20
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# psycopg2 и common импортируются внутри функций: в дочернем процессе
+# их импорт входит в замер import_ms, как на настоящем холодном старте
+
+# Модули, которые не должны загружаться на холодном старте обычных GET
+LAZY_MODULES = ('requests', 'brotli', 'zstandard')
+
+def events(group_id: int) -> Dict[str, Dict[str, Any]]:
+    return {
+        'groups': {'httpMethod': 'GET', 'queryStringParameters': {'limit': '20'}},
+        'reviews': {'httpMethod': 'GET', 'queryStringParameters': {'group_id': str(group_id), 'limit': '20'}}
+    }
+
+def child(function_name: str, event: Dict[str, Any]) -> None:
+    started = time.perf_counter()
+    from common import load_backend
+    module = load_backend(function_name)
+    imported = time.perf_counter()
+    first = module.handler(event, None)
+    first_done = time.perf_counter()
+    second = module.handler(event, None)
+    second_done = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_ms': (first_done - imported) * 1000,
+        'warm_ms': (second_done - first_done) * 1000,
+        'status': [first['statusCode'], second['statusCode']],
+        'lazy_loaded': [name for name in LAZY_MODULES if name in sys.modules]
+    }))
+
+def parse_importtime(stderr: str, top: int) -> List[Tuple[str, float]]:
+    # Строки вида "import time:   self [us] | cumulative | imported package"
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, package = line[len('import time:'):].split('|')
+        if not package.startswith(' ' * 2):
+            imports.append((package.strip(), int(cumulative) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return [(name, round(ms, 1)) for name, ms in imports[:top]]
+
+def spawn(function_name: str, event: Dict[str, Any], env: Dict[str, str], importtime: bool) -> Tuple[Dict[str, Any], str, float]:
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += [__file__, '--child', function_name, '--event', json.dumps(event)]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=BENCH_DIR, env=env, capture_output=True, text=True, check=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr, process_ms
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    from common import percentile
+    return {
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'max_ms': round(max(samples), 2)
+    }
+
+def run(function_name: str, event: Dict[str, Any], runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {'process': [], 'import': [], 'first': [], 'warm': []}
+    lazy_loaded = set()
+    for _ in range(runs):
+        result, _, process_ms = spawn(function_name, event, env, importtime=False)
+        if result['status'][0] >= 500 or result['status'][1] >= 500:
+            raise RuntimeError(f'{function_name}: HTTP {result["status"]}')
+        samples['process'].append(process_ms)
+        for key in ('import', 'first', 'warm'):
+            samples[key].append(result[f'{key}_ms'])
+        lazy_loaded.update(result['lazy_loaded'])
+
+    _, stderr, _ = spawn(function_name, event, env, importtime=True)
+    report = {key: summarize(values) for key, values in samples.items()}
+    report['slowest_imports_ms'] = parse_importtime(stderr, 10)
+    report['lazy_loaded'] = sorted(lazy_loaded)
+    return report
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--no-prepared', action='store_true', help='DB_PREPARED_STATEMENTS=false в дочерних процессах')
+    parser.add_argument('--child')
+    parser.add_argument('--event')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, json.loads(args.event))
+        return 0
+
+    dsn = os.environ.get('BENCH_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if not dsn:
+        print('BENCH_DATABASE_URL is not set', file=sys.stderr)
+        return 2
+    env = {**os.environ, 'DATABASE_URL': dsn}
+    if args.no_prepared:
+        env['DB_PREPARED_STATEMENTS'] = 'false'
+
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute('SELECT MIN(id) FROM groups')
+        group_id = cur.fetchone()[0] or 1
+    conn.close()
+
+    report = {
+        function_name: run(function_name, event, args.runs, env)
+        for function_name, event in events(group_id).items()
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
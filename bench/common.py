@@ -0,0 +1,99 @@
+'''
+Общие помощники бенчмарков: миграции, загрузка handler() из backend/*/index.py,
+счётчик SQL-запросов и сводка задержек
+'''
+
+import importlib.util
+import statistics
+import threading
+from pathlib import Path
+from typing import Dict, Any, List
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def apply_migrations(conn) -> None:
+    '''
+    Применяет ещё не применённые миграции и запоминает их в bench_migrations:
+    V0001 вставляет тестовые данные без ON CONFLICT, и повторный прогон
+    по той же базе размножил бы их
+    '''
+    with conn.cursor() as cur:
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS bench_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        ''')
+        cur.execute('SELECT name FROM bench_migrations')
+        applied = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    for path in sorted((ROOT / 'db_migrations').glob('V*.sql')):
+        if path.name in applied:
+            continue
+        with conn.cursor() as cur:
+            cur.execute(path.read_text())
+            cur.execute('INSERT INTO bench_migrations (name) VALUES (%s)', (path.name,))
+        conn.commit()
+
+def load_backend(function_name: str):
+    spec = importlib.util.spec_from_file_location(
+        f'bench_{function_name}_index', ROOT / 'backend' / function_name / 'index.py'
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self) -> None:
+        with self._lock:
+            self.count += 1
+
+    def reset(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+query_counter = QueryCounter()
+
+class CountingDictCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        query_counter.increment()
+        return super().execute(query, vars)
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        query_counter.increment()
+        return super().execute(query, vars)
+
+def install_query_counter(*modules) -> None:
+    '''
+    Подменяет фабрики курсоров в загруженных модулях, чтобы считать запросы.
+    Менять глобальный psycopg2.extensions.cursor допустимо только в процессе бенчмарка.
+    '''
+    for module in modules:
+        module.RealDictCursor = CountingDictCursor
+    psycopg2.extensions.cursor = CountingCursor
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples_ms: List[float], elapsed_s: float, queries: int, errors: int) -> Dict[str, Any]:
+    return {
+        'requests': len(samples_ms),
+        'errors': errors,
+        'p50_ms': round(statistics.median(samples_ms), 2),
+        'p95_ms': round(percentile(samples_ms, 95), 2),
+        'p99_ms': round(percentile(samples_ms, 99), 2),
+        'throughput_rps': round(len(samples_ms) / elapsed_s, 1) if elapsed_s else 0,
+        'queries_per_request': round(queries / len(samples_ms), 2)
+    }
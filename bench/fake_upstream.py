@@ -0,0 +1,156 @@
+'''
+Локальная подмена api.vk.com и api.tgstat.ru для бенчмарков: отвечает
+правдоподобными JSON с настраиваемой задержкой и долей ответов о превышении лимита
+Запуск отдельно: python bench/fake_upstream.py --port 8090 --latency-ms 80
+'''
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+def fake_vk_group(group_id: str) -> Dict[str, Any]:
+    numeric = int(re.sub(r'\D', '', group_id) or random.randint(1, 10_000_000))
+    return {
+        'id': numeric,
+        'screen_name': group_id.lower(),
+        'name': f'VK group {group_id}',
+        'members_count': 1000 + numeric % 500_000
+    }
+
+def fake_vk_wall(count: int, offset: int = 0) -> Dict[str, Any]:
+    now = int(time.time())
+    return {
+        'count': 5000,
+        'items': [
+            {
+                'id': i,
+                'date': now - i * 3600,
+                'likes': {'count': random.randint(0, 500)},
+                'comments': {'count': random.randint(0, 50)},
+                'reposts': {'count': random.randint(0, 30)},
+                'views': {'count': random.randint(100, 20_000)}
+            }
+            for i in range(offset, min(offset + count, 5000))
+        ]
+    }
+
+def fake_history(field: str, days: int = 30) -> List[Dict[str, Any]]:
+    today = time.time()
+    return [
+        {'period': time.strftime('%Y-%m-%d', time.gmtime(today - (days - i) * 86400)), field: 10_000 + i * 37}
+        for i in range(days)
+    ]
+
+def throttled(path: str) -> Tuple[int, Dict[str, Any]]:
+    if '/method/' in path:
+        return 200, {'error': {'error_code': 6, 'error_msg': 'Too many requests per second'}}
+    return 429, {'status': 'error', 'error': 'too_many_requests'}
+
+def route(path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+    if path.endswith('/groups.getById'):
+        ids = (params.get('group_ids') or params.get('group_id') or '').split(',')
+        return 200, {'response': [fake_vk_group(group_id) for group_id in ids if group_id]}
+    if path.endswith('/wall.get'):
+        return 200, {'response': fake_vk_wall(min(int(params.get('count', 10)), 100), int(params.get('offset', 0)))}
+    if path.endswith('/execute'):
+        calls = re.findall(r'API\.wall\.get\((\{.*?\})\)', params.get('code', ''))
+        walls = []
+        for call in calls:
+            count = int(re.search(r'"count":\s*(\d+)', call).group(1))
+            offset = re.search(r'"offset":\s*(\d+)', call)
+            walls.append(fake_vk_wall(min(count, 100), int(offset.group(1)) if offset else 0))
+        return 200, {'response': walls}
+    if path.endswith('/channels/get'):
+        channel = params.get('channelId', 'channel')
+        return 200, {'status': 'ok', 'response': {
+            'title': f'Channel {channel}', 'username': channel, 'category': 'tech',
+            'participants_count': 25_000, 'posts_count': 1200
+        }}
+    if path.endswith('/channels/stat'):
+        return 200, {'status': 'ok', 'response': {'daily_reach': 9000, 'mentions_count': 42}}
+    if path.endswith('/channels/posts'):
+        limit = min(int(params.get('limit', 10)), 50)
+        offset = int(params.get('offset', 0))
+        return 200, {'status': 'ok', 'response': {'total_count': 1200, 'items': [
+            {'id': i, 'date': int(time.time()) - i * 3600,
+             'views': random.randint(1000, 9000), 'forwards': random.randint(0, 100)}
+            for i in range(offset, min(offset + limit, 1200))
+        ]}}
+    if path.endswith('/channels/subscribers'):
+        return 200, {'status': 'ok', 'response': fake_history('participants_count')}
+    if path.endswith('/channels/views'):
+        return 200, {'status': 'ok', 'response': fake_history('views_avg')}
+    return 404, {'error': {'error_code': 404, 'error_msg': 'Unknown method'}}
+
+class FakeUpstreamServer:
+    def __init__(self, port: int = 0, latency_ms: float = 50, jitter_ms: float = 20, throttle_ratio: float = 0.0):
+        server = self
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_ratio = throttle_ratio
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._respond(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self._respond(parse_qs(self.rfile.read(length).decode()))
+
+            def _respond(self, raw_params):
+                with server._lock:
+                    server.calls += 1
+                delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+                time.sleep(max(0.0, delay) / 1000)
+                params = {key: values[0] for key, values in raw_params.items()}
+                path = urlparse(self.path).path
+                if random.random() < server.throttle_ratio:
+                    with server._lock:
+                        server.throttled += 1
+                    status, payload = throttled(path)
+                else:
+                    status, payload = route(path, params)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self) -> 'FakeUpstreamServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--throttle-ratio', type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeUpstreamServer(args.port, args.latency_ms, args.jitter_ms, args.throttle_ratio)
+    print(f'VK_API_URL={fake.url}/method TGSTAT_API_URL={fake.url}')
+    fake.httpd.serve_forever()
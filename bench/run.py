@@ -0,0 +1,272 @@
+'''
+Нагрузочный прогон handler() обеих функций на локальном Postgres с подменой VK/TGStat:
+в процессе и через локальный HTTP-шлюз, с заданной параллельностью.
+Печатает p50/p95/p99, пропускную способность и число SQL-запросов на эндпоинт,
+размер ответа до и после сжатия и CPU на сжатие, сравнивает результат с JSON-базой
+и падает при регрессии.
+Запуск: BENCH_DATABASE_URL=postgresql://localhost/bench python bench/run.py --seed --migrate \
+        --groups 100000 --reviews 10000000 --concurrency 16 --output bench/result.json --baseline bench/baseline.json
+'''
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, List, Tuple
+from urllib.parse import urlencode, urlparse, parse_qsl
+
+from common import load_backend, install_query_counter, query_counter, summarize
+from fake_upstream import FakeUpstreamServer
+from seed import seed
+
+ADMIN_TOKEN = 'bench'
+
+def scenarios(group_ids: List[int]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    first, second, third = group_ids[:3]
+    review = {'group_id': first, 'user_name': 'bench', 'rating': 4, 'text': 'Бенчмарк'}
+    return [
+        ('groups', 'list', {'httpMethod': 'GET', 'queryStringParameters': {}}),
+        ('groups', 'search', {'httpMethod': 'GET', 'queryStringParameters': {'search': 'python', 'limit': '20'}}),
+        ('groups', 'by_members', {'httpMethod': 'GET', 'queryStringParameters': {'platform': 'vk', 'sort': 'members', 'min_members': '100000', 'limit': '20'}}),
+        ('groups', 'typeahead', {'httpMethod': 'GET', 'queryStringParameters': {'search': 'Ди', 'mode': 'prefix', 'limit': '10'}}),
+        ('groups', 'stats', {'httpMethod': 'GET', 'queryStringParameters': {'stats': 'true'}}),
+        ('groups', 'leaderboard', {'httpMethod': 'GET', 'queryStringParameters': {'leaderboard': 'rating', 'platform': 'vk', 'limit': '20', 'offset': '40'}}),
+        ('groups', 'detail', {'httpMethod': 'GET', 'queryStringParameters': {'detail': str(first)}}),
+        ('groups', 'analytics', {'httpMethod': 'GET', 'queryStringParameters': {'analytics': str(first)}}),
+        ('groups', 'analytics_deep', {'httpMethod': 'GET', 'queryStringParameters': {'analytics': str(first), 'deep': 'true'}}),
+        ('groups', 'analytics_batch', {'httpMethod': 'GET', 'queryStringParameters': {'analytics': f'{first},{second},{third}'}}),
+        ('reviews', 'feed', {'httpMethod': 'GET', 'queryStringParameters': {}}),
+        ('reviews', 'group_page', {'httpMethod': 'GET', 'queryStringParameters': {'group_id': str(first), 'limit': '20'}}),
+        ('reviews', 'group_all', {'httpMethod': 'GET', 'queryStringParameters': {'group_id': str(first)}}),
+        ('reviews', 'group_filtered', {'httpMethod': 'GET', 'queryStringParameters': {'group_id': str(first), 'min_rating': '4', 'sort': 'rating', 'limit': '20'}}),
+        ('reviews', 'histogram', {'httpMethod': 'GET', 'queryStringParameters': {'group_id': str(first), 'histogram': 'true'}}),
+        ('reviews', 'create', {'httpMethod': 'POST', 'queryStringParameters': {}, 'body': json.dumps(review)}),
+        ('reviews', 'drain_outbox', {'httpMethod': 'POST', 'queryStringParameters': {'drain_outbox': 'true'}, 'headers': {'X-Admin-Token': ADMIN_TOKEN}}),
+    ]
+
+class HandlerShim:
+    '''
+    Локальный HTTP-сервер, превращающий запросы в event облачной функции
+    '''
+
+    def __init__(self, handlers: Dict[str, Callable]):
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                parsed = urlparse(self.path)
+                function_name = parsed.path.strip('/').split('/')[0]
+                length = int(self.headers.get('Content-Length') or 0)
+                event = {
+                    'httpMethod': self.command,
+                    'queryStringParameters': dict(parse_qsl(parsed.query)),
+                    'headers': dict(self.headers.items()),
+                    'body': self.rfile.read(length).decode() if length else ''
+                }
+                response = handlers[function_name](event, None)
+                if response.get('isBase64Encoded'):
+                    body = base64.b64decode(response.get('body', ''))
+                else:
+                    body = response.get('body', '').encode()
+                self.send_response(response['statusCode'])
+                for name, value in (response.get('headers') or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+def call_in_process(handler: Callable, event: Dict[str, Any], accept_encoding: str) -> int:
+    return handler({**event, 'headers': {**event.get('headers', {}), 'Accept-Encoding': accept_encoding}}, None)['statusCode']
+
+def call_over_http(base_url: str, function_name: str, event: Dict[str, Any], accept_encoding: str) -> int:
+    query = urlencode(event.get('queryStringParameters') or {})
+    body = event.get('body')
+    request = urllib.request.Request(
+        f'{base_url}/{function_name}?{query}',
+        data=body.encode() if body else None,
+        method=event['httpMethod'],
+        headers={'Content-Type': 'application/json', **event.get('headers', {}), 'Accept-Encoding': accept_encoding}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def run_endpoint(call: Callable[[], int], total: int, concurrency: int) -> Dict[str, Any]:
+    call()
+    query_counter.reset()
+    samples: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        status = call()
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            samples.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    return summarize(samples, time.perf_counter() - started, query_counter.reset(), errors)
+
+def measure_compression(module, event: Dict[str, Any], rounds: int = 20) -> Dict[str, Any]:
+    '''
+    Размер несжатого ответа и для каждой доступной кодировки - размер, экономия
+    и процессорное время сжатия одного ответа тем же кодом, что в handler()
+    '''
+    response = module.handler({**event, 'headers': {}}, None)
+    raw = (response.get('body') or '').encode()
+    report: Dict[str, Any] = {'raw_bytes': len(raw)}
+    if len(raw) < module.COMPRESSION_MIN_SIZE:
+        report['skipped'] = True
+        return report
+    for encoding in module.available_encodings():
+        started = time.process_time()
+        for _ in range(rounds):
+            compressed = module.compress_body(raw, encoding)
+        report[encoding] = {
+            'bytes': len(compressed),
+            'saved_bytes': len(raw) - len(compressed),
+            'cpu_ms': round((time.process_time() - started) * 1000 / rounds, 3)
+        }
+    return report
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    regressions = []
+    for mode, endpoints in result.items():
+        for name, stats in endpoints.items():
+            base = baseline.get(mode, {}).get(name)
+            if not base:
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if base[metric] and stats[metric] > base[metric] * (1 + max_regression):
+                    regressions.append(f'{mode}/{name} {metric}: {base[metric]} -> {stats[metric]}')
+            if stats['queries_per_request'] > base['queries_per_request']:
+                regressions.append(
+                    f"{mode}/{name} queries_per_request: {base['queries_per_request']} -> {stats['queries_per_request']}"
+                )
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--migrate', action='store_true')
+    parser.add_argument('--groups', type=int, default=100_000)
+    parser.add_argument('--reviews', type=int, default=10_000_000)
+    parser.add_argument('--requests', type=int, default=500, help='запросов на эндпоинт')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=['inprocess', 'http', 'both'], default='both')
+    parser.add_argument('--upstream-latency-ms', type=float, default=80)
+    parser.add_argument('--accept-encoding', default='gzip, br', help='Accept-Encoding клиентов, пустая строка - без сжатия')
+    parser.add_argument('--upstream-throttle', type=float, default=0.0, help='доля ответов "слишком много запросов"')
+    parser.add_argument('--only', nargs='*', help='имена эндпоинтов, например list stats feed')
+    parser.add_argument('--replicas', help='DSN реплик через запятую для проверки маршрутизации чтений')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        print('BENCH_DATABASE_URL is not set', file=sys.stderr)
+        return 2
+    if args.seed:
+        seed(dsn, args.groups, args.reviews, args.migrate)
+
+    fake = FakeUpstreamServer(latency_ms=args.upstream_latency_ms, throttle_ratio=args.upstream_throttle).start()
+    os.environ.update({
+        'DATABASE_URL': dsn,
+        # Поток бенчмарка - это отдельный контейнер с одним запросом: пул не раздувается
+        # под параллельные вызовы внешних API, они должны укладываться в обычный бюджет
+        'DB_POOL_MAX_SIZE': str(args.concurrency),
+        'VK_API_TOKEN': 'bench',
+        'TGSTAT_API_TOKEN': 'bench',
+        'ADMIN_TOKEN': ADMIN_TOKEN,
+        'VK_API_URL': f'{fake.url}/method',
+        'TGSTAT_API_URL': fake.url,
+        'VK_RATE_LIMIT': '10000',
+        'VK_RATE_BURST': '10000',
+        'TGSTAT_RATE_LIMIT': '10000',
+        'TGSTAT_RATE_BURST': '10000'
+    })
+    if args.replicas:
+        os.environ['DATABASE_REPLICA_URLS'] = args.replicas
+    modules = {name: load_backend(name) for name in ('groups', 'reviews')}
+    install_query_counter(*modules.values())
+    handlers = {name: module.handler for name, module in modules.items()}
+
+    with modules['groups'].db_cursor() as cur:
+        cur.execute("SELECT id FROM groups WHERE COALESCE(vk_group_id, '') <> '' ORDER BY id LIMIT 3")
+        group_ids = [row['id'] for row in cur.fetchall()]
+    if len(group_ids) < 3:
+        print('Need at least 3 groups with vk_group_id, run with --seed', file=sys.stderr)
+        return 2
+
+    modes = ['inprocess', 'http'] if args.mode == 'both' else [args.mode]
+    shim = HandlerShim(handlers) if 'http' in modes else None
+    result: Dict[str, Dict[str, Any]] = {}
+    for mode in modes:
+        result[mode] = {}
+        for function_name, name, event in scenarios(group_ids):
+            if args.only and name not in args.only:
+                continue
+            if mode == 'inprocess':
+                call = lambda: call_in_process(handlers[function_name], event, args.accept_encoding)
+            else:
+                call = lambda: call_over_http(shim.url, function_name, event, args.accept_encoding)
+            result[mode][name] = run_endpoint(call, args.requests, args.concurrency)
+            print(f'{mode:9} {name:16} {json.dumps(result[mode][name])}', file=sys.stderr)
+    result['compression'] = {
+        name: measure_compression(modules[function_name], event)
+        for function_name, name, event in scenarios(group_ids)
+        if event['httpMethod'] == 'GET' and (not args.only or name in args.only)
+    }
+    for name, report in result['compression'].items():
+        print(f'compress  {name:16} {json.dumps(report)}', file=sys.stderr)
+    result['upstream_calls'] = {'total': fake.calls, 'throttled': fake.throttled}
+    fake.stop()
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(
+                {mode: endpoints for mode, endpoints in result.items() if mode in modes},
+                json.load(f),
+                args.max_regression
+            )
+        if regressions:
+            print('Regressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
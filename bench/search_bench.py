@@ -0,0 +1,86 @@
+'''
+Бенчмарк поиска групп на локальном Postgres: заполняет таблицу groups
+до заданного объёма и замеряет задержку groups?search=... через handler()
+Запуск: BENCH_DATABASE_URL=postgresql://localhost/bench python bench/search_bench.py --groups 1000000 --migrate
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, Any
+
+import psycopg2
+
+from common import apply_migrations, load_backend, percentile
+from seed import seed_groups
+
+QUERIES = [
+    ('full', 'python'),
+    ('full', 'фотогр'),
+    ('full', 'марктинг'),
+    ('full', 'клуб 123'),
+    ('prefix', 'Ди'),
+    ('prefix', 'Путеш'),
+    ('prefix', 'P'),
+]
+
+def run(handler, iterations: int) -> Dict[str, Any]:
+    report = {}
+    for mode, query in QUERIES:
+        event = {
+            'httpMethod': 'GET',
+            'queryStringParameters': {'search': query, 'mode': mode, 'limit': '20'}
+        }
+        handler(event, None)
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = handler(event, None)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response['statusCode'] == 200, response
+        report[f'{mode}:{query}'] = {
+            'p50_ms': round(statistics.median(samples), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+            'results': len(json.loads(response['body']))
+        }
+    return report
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--budget-ms', type=float, default=10.0)
+    parser.add_argument('--migrate', action='store_true')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('BENCH_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if not dsn:
+        print('BENCH_DATABASE_URL is not set', file=sys.stderr)
+        return 2
+    os.environ['DATABASE_URL'] = dsn
+
+    conn = psycopg2.connect(dsn)
+    if args.migrate:
+        apply_migrations(conn)
+    with conn.cursor() as cur:
+        seed_groups(cur, args.groups)
+        conn.commit()
+        cur.execute('ANALYZE groups')
+    conn.commit()
+    conn.close()
+
+    report = run(load_backend('groups').handler, args.iterations)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    slow = [name for name, stats in report.items() if stats['p95_ms'] > args.budget_ms]
+    if slow:
+        print(f"p95 over {args.budget_ms} ms: {', '.join(slow)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
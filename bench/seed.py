@@ -0,0 +1,122 @@
+'''
+Заполняет локальный Postgres группами и отзывами заданного объёма по схеме из db_migrations
+Запуск: BENCH_DATABASE_URL=postgresql://localhost/bench python bench/seed.py --groups 100000 --reviews 10000000 --migrate
+'''
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+from common import apply_migrations
+
+BATCH_SIZE = 1_000_000
+
+WORDS = [
+    'Python', 'Дизайн', 'Маркетинг', 'Фотография', 'IT', 'Новости', 'Музыка', 'Кино',
+    'Спорт', 'Путешествия', 'Крипто', 'Игры', 'Книги', 'Рецепты', 'Авто', 'Финансы',
+    'разработчики', 'сообщество', 'клуб', 'канал', 'PRO', 'чат', 'академия', 'лаборатория'
+]
+
+def seed_groups(cur, total: int) -> int:
+    cur.execute('SELECT COUNT(*) FROM groups')
+    existing = cur.fetchone()[0]
+    while existing < total:
+        size = min(BATCH_SIZE, total - existing)
+        cur.execute('''
+            INSERT INTO groups (name, platform, members, description, link, vk_group_id, telegram_channel_id)
+            SELECT
+                w[1 + floor(random() * array_length(w, 1))::int] || ' ' ||
+                w[1 + floor(random() * array_length(w, 1))::int] || ' ' || i,
+                platform,
+                (1 + floor(random() * 900))::int || 'K',
+                'Группа про ' || w[1 + floor(random() * array_length(w, 1))::int] ||
+                ' и ' || w[1 + floor(random() * array_length(w, 1))::int],
+                'https://example.com/' || i,
+                CASE WHEN platform = 'vk' THEN 'club' || i END,
+                CASE WHEN platform = 'telegram' THEN 'channel' || i END
+            FROM generate_series(%s, %s) AS i,
+                 LATERAL (SELECT CASE WHEN i %% 2 = 0 THEN 'vk' ELSE 'telegram' END AS platform) p,
+                 (SELECT %s::text[] AS w) AS words
+        ''', (existing + 1, existing + size, WORDS))
+        existing += size
+    return existing
+
+def seed_reviews(cur, total: int) -> int:
+    cur.execute('SELECT MIN(id), MAX(id) FROM groups')
+    min_group, max_group = cur.fetchone()
+    cur.execute('SELECT COUNT(*) FROM reviews')
+    existing = cur.fetchone()[0]
+    while existing < total:
+        size = min(BATCH_SIZE, total - existing)
+        cur.execute('''
+            INSERT INTO reviews (group_id, user_name, rating, text, created_at)
+            SELECT
+                %s + floor(random() * (%s - %s + 1))::int,
+                'user ' || i,
+                1 + floor(random() * 5)::int,
+                repeat('Отзыв о группе. ', 1 + floor(random() * 10)::int),
+                now() - random() * interval '365 days'
+            FROM generate_series(%s, %s) AS i
+        ''', (min_group, max_group, min_group, existing + 1, existing + size))
+        existing += size
+        print(f'reviews: {existing}/{total}', file=sys.stderr)
+    return existing
+
+def rebuild_derived(cur) -> None:
+    cur.execute('UPDATE groups SET members_count = parse_members_count(members) WHERE members_count IS NULL')
+    cur.execute('TRUNCATE group_rating_stats')
+    cur.execute('''
+        INSERT INTO group_rating_stats (
+            group_id, reviews_count, rating_sum,
+            rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count
+        )
+        SELECT
+            g.id,
+            COUNT(r.id),
+            COALESCE(SUM(r.rating), 0),
+            COUNT(CASE WHEN r.rating = 1 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 2 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 3 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 4 THEN 1 END),
+            COUNT(CASE WHEN r.rating = 5 THEN 1 END)
+        FROM groups g
+        LEFT JOIN reviews r ON g.id = r.group_id
+        GROUP BY g.id
+    ''')
+    cur.execute('REFRESH MATERIALIZED VIEW group_leaderboard')
+    cur.execute('ANALYZE')
+
+def seed(dsn: str, groups: int, reviews: int, migrate: bool) -> None:
+    conn = psycopg2.connect(dsn)
+    if migrate:
+        apply_migrations(conn)
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        seed_groups(cur, groups)
+        conn.commit()
+        seed_reviews(cur, reviews)
+        conn.commit()
+        rebuild_derived(cur)
+    conn.commit()
+    conn.close()
+    print(f'seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=100_000)
+    parser.add_argument('--reviews', type=int, default=10_000_000)
+    parser.add_argument('--migrate', action='store_true')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        print('BENCH_DATABASE_URL is not set', file=sys.stderr)
+        return 2
+    seed(dsn, args.groups, args.reviews, args.migrate)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+CREATE TABLE IF NOT EXISTS group_rating_stats (
+    group_id INTEGER PRIMARY KEY REFERENCES groups(id),
+    reviews_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1_count INTEGER NOT NULL DEFAULT 0,
+    rating_2_count INTEGER NOT NULL DEFAULT 0,
+    rating_3_count INTEGER NOT NULL DEFAULT 0,
+    rating_4_count INTEGER NOT NULL DEFAULT 0,
+    rating_5_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE group_rating_stats IS 'Инкрементальные агрегаты оценок по группам: обновляются при добавлении отзыва, сверяются через groups?reconcile=true';
+
+INSERT INTO group_rating_stats (
+    group_id, reviews_count, rating_sum,
+    rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count
+)
+SELECT
+    g.id,
+    COUNT(r.id),
+    COALESCE(SUM(r.rating), 0),
+    COUNT(CASE WHEN r.rating = 1 THEN 1 END),
+    COUNT(CASE WHEN r.rating = 2 THEN 1 END),
+    COUNT(CASE WHEN r.rating = 3 THEN 1 END),
+    COUNT(CASE WHEN r.rating = 4 THEN 1 END),
+    COUNT(CASE WHEN r.rating = 5 THEN 1 END)
+FROM groups g
+LEFT JOIN reviews r ON g.id = r.group_id
+GROUP BY g.id
+ON CONFLICT (group_id) DO NOTHING;
@@ -0,0 +1,4 @@
+CREATE INDEX IF NOT EXISTS idx_reviews_group_created ON reviews(group_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews(created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_reviews_group_id;
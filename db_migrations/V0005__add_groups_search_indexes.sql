@@ -0,0 +1,5 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_groups_name_trgm ON groups USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_groups_description_trgm ON groups USING gin (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_groups_name_prefix ON groups (lower(name) text_pattern_ops);
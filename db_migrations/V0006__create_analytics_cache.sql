@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS analytics_cache (
+    platform VARCHAR(20) NOT NULL,
+    channel_id VARCHAR(255) NOT NULL,
+    payload JSONB,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMPTZ NOT NULL,
+    refreshing_until TIMESTAMPTZ,
+    PRIMARY KEY (platform, channel_id)
+);
+
+COMMENT ON TABLE analytics_cache IS 'Кэш ответов VK API и TGStat по платформе и ID канала, переживает холодный старт функции';
+COMMENT ON COLUMN analytics_cache.refreshing_until IS 'Аренда обновления: пока не истекла, другие инстансы не ходят во внешний API за этим ключом';
@@ -0,0 +1,30 @@
+CREATE TABLE IF NOT EXISTS analytics_snapshots (
+    group_id INTEGER NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    collected_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    subscribers INTEGER,
+    avg_views INTEGER,
+    metrics JSONB NOT NULL,
+    PRIMARY KEY (group_id, collected_at)
+) PARTITION BY RANGE (collected_at);
+
+COMMENT ON TABLE analytics_snapshots IS 'Append-only снимки аналитики VK/TGStat, собираемые groups?collect=true; партиции по месяцам';
+
+CREATE OR REPLACE FUNCTION ensure_analytics_snapshot_partitions(months_ahead INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF analytics_snapshots FOR VALUES FROM (%L) TO (%L)',
+            'analytics_snapshots_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + interval '1 month')::date
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_analytics_snapshot_partitions(1);
@@ -0,0 +1,12 @@
+ALTER TABLE groups ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+    resource VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE cache_versions IS 'Счётчики версий для ETag/Last-Modified: увеличиваются в той же транзакции, что и запись в groups/reviews';
+
+INSERT INTO cache_versions (resource) VALUES ('groups'), ('reviews')
+ON CONFLICT (resource) DO NOTHING;
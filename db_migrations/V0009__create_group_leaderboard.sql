@@ -0,0 +1,37 @@
+CREATE MATERIALIZED VIEW IF NOT EXISTS group_leaderboard AS
+WITH prior AS (
+    SELECT COALESCE(SUM(rating_sum)::numeric / NULLIF(SUM(reviews_count), 0), 3) AS mean_rating
+    FROM group_rating_stats
+),
+scored AS (
+    SELECT
+        g.id AS group_id,
+        g.platform,
+        g.name,
+        g.avatar,
+        g.members,
+        COALESCE(s.reviews_count, 0) AS reviews_count,
+        COALESCE(s.rating_sum::numeric / NULLIF(s.reviews_count, 0), 0) AS avg_rating,
+        (COALESCE(s.rating_sum, 0) + 10 * p.mean_rating) / (COALESCE(s.reviews_count, 0) + 10) AS weighted_rating
+    FROM groups g
+    LEFT JOIN group_rating_stats s ON g.id = s.group_id
+    CROSS JOIN prior p
+)
+SELECT
+    scored.*,
+    ROW_NUMBER() OVER (PARTITION BY platform ORDER BY weighted_rating DESC, reviews_count DESC, group_id) AS rating_rank,
+    ROW_NUMBER() OVER (ORDER BY weighted_rating DESC, reviews_count DESC, group_id) AS rating_rank_all,
+    ROW_NUMBER() OVER (PARTITION BY platform ORDER BY reviews_count DESC, weighted_rating DESC, group_id) AS reviews_rank,
+    ROW_NUMBER() OVER (ORDER BY reviews_count DESC, weighted_rating DESC, group_id) AS reviews_rank_all
+FROM scored;
+
+COMMENT ON MATERIALIZED VIEW group_leaderboard IS 'Рейтинги групп: байесовская оценка с априорным весом 10 отзывов со средней по всем группам; обновляется groups?refresh_leaderboard=true';
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_group_leaderboard_group ON group_leaderboard(group_id);
+CREATE INDEX IF NOT EXISTS idx_group_leaderboard_rating ON group_leaderboard(platform, rating_rank);
+CREATE INDEX IF NOT EXISTS idx_group_leaderboard_rating_all ON group_leaderboard(rating_rank_all);
+CREATE INDEX IF NOT EXISTS idx_group_leaderboard_reviews ON group_leaderboard(platform, reviews_rank);
+CREATE INDEX IF NOT EXISTS idx_group_leaderboard_reviews_all ON group_leaderboard(reviews_rank_all);
+
+INSERT INTO cache_versions (resource, version) VALUES ('leaderboard', 0)
+ON CONFLICT (resource) DO NOTHING;
@@ -0,0 +1,22 @@
+CREATE TABLE IF NOT EXISTS api_rate_buckets (
+    api VARCHAR(20) NOT NULL,
+    token_key VARCHAR(16) NOT NULL,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (api, token_key)
+);
+
+COMMENT ON TABLE api_rate_buckets IS 'Token bucket исходящих запросов к VK API и TGStat на пару (API, токен), общий для всех инстансов функции';
+COMMENT ON COLUMN api_rate_buckets.token_key IS 'Префикс sha256 от токена: сам токен в базе не хранится';
+COMMENT ON COLUMN api_rate_buckets.tokens IS 'Остаток токенов; отрицательное значение - длина очереди и бэкофф после ошибки лимита';
+
+CREATE TABLE IF NOT EXISTS api_quota_usage (
+    api VARCHAR(20) NOT NULL,
+    token_key VARCHAR(16) NOT NULL,
+    day DATE NOT NULL DEFAULT CURRENT_DATE,
+    requests INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (api, token_key, day)
+);
+
+COMMENT ON TABLE api_quota_usage IS 'Расход квоты внешних API по дням: отправленные запросы и ответы "слишком много запросов"';
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS review_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    review_id INTEGER NOT NULL UNIQUE,
+    group_id INTEGER NOT NULL,
+    rating INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMPTZ
+);
+
+COMMENT ON TABLE review_outbox IS 'Очередь производной работы по новым отзывам: пишется в одной транзакции с reviews, разбирается reviews?drain_outbox=true';
+COMMENT ON COLUMN review_outbox.processed_at IS 'Отметка о применении агрегатов; ставится в той же транзакции, поэтому повторный разбор не считает отзыв дважды';
+
+CREATE INDEX IF NOT EXISTS idx_review_outbox_pending ON review_outbox(id) WHERE processed_at IS NULL;
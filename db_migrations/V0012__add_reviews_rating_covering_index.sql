@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS idx_reviews_group_rating_created ON reviews(group_id, rating DESC, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_reviews_rating;
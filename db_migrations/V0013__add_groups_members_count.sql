@@ -0,0 +1,35 @@
+CREATE OR REPLACE FUNCTION parse_members_count(value TEXT) RETURNS INTEGER
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN counted.n <= 2147483647 THEN counted.n::integer END
+    FROM (
+        SELECT round(replace(parsed.m[1], ',', '.')::numeric * CASE lower(COALESCE(parsed.m[2], ''))
+            WHEN 'k' THEN 1000
+            WHEN 'к' THEN 1000
+            WHEN 'тыс' THEN 1000
+            WHEN 'm' THEN 1000000
+            WHEN 'м' THEN 1000000
+            WHEN 'млн' THEN 1000000
+            ELSE 1
+        END) AS n
+        FROM (
+            SELECT regexp_match(
+                regexp_replace(COALESCE(value, ''), '\s', '', 'g'),
+                '^([0-9]+(?:[.,][0-9]+)?)(k|m|к|м|тыс|млн)?\.?$',
+                'i'
+            ) AS m
+        ) parsed
+    ) counted
+$$;
+
+COMMENT ON FUNCTION parse_members_count(TEXT) IS 'Число подписчиков из строки вида 81K, 1.2M, 300 тыс.; NULL, если строка не разбирается или число не помещается в INTEGER';
+
+ALTER TABLE groups ADD COLUMN IF NOT EXISTS members_count INTEGER;
+
+COMMENT ON COLUMN groups.members_count IS 'Число подписчиков: из members при сохранении, точное значение - из VK API и TGStat';
+
+UPDATE groups SET members_count = parse_members_count(members) WHERE members_count IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_groups_platform_members ON groups(platform, members_count DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_groups_members ON groups(members_count DESC NULLS LAST);
+
+DROP INDEX IF EXISTS idx_groups_platform;
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_review_outbox_pending_group ON review_outbox(group_id, rating) WHERE processed_at IS NULL;
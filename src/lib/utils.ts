@@ -4,3 +4,25 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+const READ_AFTER_KEY = "read_after"
+const READ_AFTER_TTL_MS = 60_000
+
+// Запоминает LSN записи из X-Read-After, чтобы следующие чтения не ушли на отстающую реплику
+export function rememberWrite(response: Response) {
+  const lsn = response.headers.get("X-Read-After")
+  if (lsn) {
+    sessionStorage.setItem(READ_AFTER_KEY, JSON.stringify({ lsn, at: Date.now() }))
+  }
+}
+
+export function withReadAfter(url: string) {
+  const saved = sessionStorage.getItem(READ_AFTER_KEY)
+  if (!saved) return url
+  const { lsn, at } = JSON.parse(saved)
+  if (Date.now() - at > READ_AFTER_TTL_MS) {
+    sessionStorage.removeItem(READ_AFTER_KEY)
+    return url
+  }
+  return `${url}${url.includes("?") ? "&" : "?"}read_after=${encodeURIComponent(lsn)}`
+}
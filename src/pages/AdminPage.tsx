@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import Header from '@/components/Header';
+import { rememberWrite, withReadAfter } from '@/lib/utils';
 import { Card } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -59,7 +60,7 @@ export default function AdminPage() {
   const fetchGroups = async () => {
     setLoading(true);
     try {
-      const response = await fetch('https://functions.poehali.dev/c2549759-4ecf-4f2e-ad07-63ae790e3b2b');
+      const response = await fetch(withReadAfter('https://functions.poehali.dev/c2549759-4ecf-4f2e-ad07-63ae790e3b2b'));
       if (!response.ok) throw new Error('Failed to fetch');
       const data = await response.json();
       setGroups((data || []).map((g: any) => ({
@@ -105,6 +106,7 @@ export default function AdminPage() {
       });
 
       if (!response.ok) throw new Error('Failed to update');
+      rememberWrite(response);
 
       setEditDialogOpen(false);
       fetchGroups();
@@ -11,6 +11,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import ReviewCard from '@/components/ReviewCard';
 import Icon from '@/components/ui/icon';
+import { rememberWrite, withReadAfter } from '@/lib/utils';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Legend } from 'recharts';
 
 const API_GROUPS = 'https://functions.poehali.dev/c2549759-4ecf-4f2e-ad07-63ae790e3b2b';
@@ -69,6 +70,7 @@ const GroupPage = () => {
   const navigate = useNavigate();
   const [group, setGroup] = useState<Group | null>(null);
   const [reviews, setReviews] = useState<Review[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [ratingStats, setRatingStats] = useState<RatingStats>({ 5: 0, 4: 0, 3: 0, 2: 0, 1: 0 });
   const [analytics, setAnalytics] = useState<GroupAnalytics | null>(null);
   const [loading, setLoading] = useState(true);
@@ -81,8 +83,7 @@ const GroupPage = () => {
 
   useEffect(() => {
     if (id) {
-      fetchGroupData();
-      fetchGroupReviews();
+      fetchGroupDetail();
       fetchAnalytics();
     }
   }, [id]);
@@ -97,19 +98,20 @@ const GroupPage = () => {
     }
   };
 
-  const fetchGroupData = async () => {
+  const fetchGroupDetail = async () => {
     try {
-      const response = await fetch(API_GROUPS);
+      const response = await fetch(withReadAfter(`${API_GROUPS}?detail=${id}`));
+      if (!response.ok) return;
       const data = await response.json();
-      const foundGroup = data.find((g: any) => g.id === parseInt(id || '0'));
       
-      if (foundGroup) {
-        setGroup({
-          ...foundGroup,
-          rating: parseFloat(foundGroup.rating) || 0,
-          reviewsCount: foundGroup.reviews_count
-        });
-      }
+      setGroup({
+        ...data.group,
+        rating: parseFloat(data.group.rating) || 0,
+        reviewsCount: data.group.reviews_count
+      });
+      setReviews(data.reviews);
+      setNextCursor(data.next_cursor);
+      setRatingStats(data.rating_distribution);
     } catch (error) {
       console.error('Error fetching group:', error);
     } finally {
@@ -117,17 +119,13 @@ const GroupPage = () => {
     }
   };
 
-  const fetchGroupReviews = async () => {
+  const loadMoreReviews = async () => {
+    if (!nextCursor) return;
     try {
-      const response = await fetch(`${API_REVIEWS}?group_id=${id}`);
+      const response = await fetch(withReadAfter(`${API_REVIEWS}?group_id=${id}&limit=20&cursor=${encodeURIComponent(nextCursor)}`));
       const data = await response.json();
-      setReviews(data);
-      
-      const stats: RatingStats = { 5: 0, 4: 0, 3: 0, 2: 0, 1: 0 };
-      data.forEach((review: Review) => {
-        stats[review.rating as keyof RatingStats]++;
-      });
-      setRatingStats(stats);
+      setReviews((prev) => [...prev, ...data.reviews]);
+      setNextCursor(data.next_cursor);
     } catch (error) {
       console.error('Error fetching reviews:', error);
     }
@@ -150,10 +148,10 @@ const GroupPage = () => {
       });
       
       if (response.ok) {
+        rememberWrite(response);
         setReviewDialogOpen(false);
         setNewReviewData({ user_name: '', rating: 5, text: '' });
-        fetchGroupReviews();
-        fetchGroupData();
+        fetchGroupDetail();
       }
     } catch (error) {
       console.error('Error adding review:', error);
@@ -175,7 +173,7 @@ const GroupPage = () => {
 
   const renderRatingBar = (rating: number) => {
     const count = ratingStats[rating as keyof RatingStats];
-    const total = reviews.length;
+    const total = Object.values(ratingStats).reduce((sum, value) => sum + value, 0);
     const percentage = total > 0 ? (count / total) * 100 : 0;
     
     return (
@@ -265,7 +263,7 @@ const GroupPage = () => {
                   <span className="text-4xl font-bold text-foreground">{group.rating.toFixed(1)}</span>
                 </div>
                 
-                <p className="text-sm text-muted-foreground mb-4">{reviews.length} отзывов</p>
+                <p className="text-sm text-muted-foreground mb-4">{group.reviews_count} отзывов</p>
                 
                 <Button className="w-full mb-3" onClick={() => setReviewDialogOpen(true)}>
                   <Icon name="MessageSquare" size={16} className="mr-2" />
@@ -544,6 +542,11 @@ const GroupPage = () => {
                     text={review.text}
                   />
                 ))}
+                {nextCursor && (
+                  <Button variant="outline" className="w-full" onClick={loadMoreReviews}>
+                    Показать ещё
+                  </Button>
+                )}
               </div>
             )}
             </div>
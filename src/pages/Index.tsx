@@ -10,6 +10,7 @@ import GroupCard from '@/components/GroupCard';
 import ReviewCard from '@/components/ReviewCard';
 import Header from '@/components/Header';
 import Icon from '@/components/ui/icon';
+import { rememberWrite, withReadAfter } from '@/lib/utils';
 
 const API_GROUPS = 'https://functions.poehali.dev/c2549759-4ecf-4f2e-ad07-63ae790e3b2b';
 const API_REVIEWS = 'https://functions.poehali.dev/3c8a0c55-f530-4c42-8527-f6e7e69ca7cf';
@@ -71,7 +72,7 @@ const Index = () => {
       if (platform) params.append('platform', platform);
       if (sort) params.append('sort', sort);
       
-      const response = await fetch(`${API_GROUPS}?${params}`);
+      const response = await fetch(withReadAfter(`${API_GROUPS}?${params}`));
       const data = await response.json();
       setGroups(data.map((g: any) => ({
         ...g,
@@ -87,7 +88,7 @@ const Index = () => {
 
   const fetchReviews = async () => {
     try {
-      const response = await fetch(API_REVIEWS);
+      const response = await fetch(withReadAfter(API_REVIEWS));
       const data = await response.json();
       setReviews(data.map((r: any) => ({
         ...r,
@@ -114,6 +115,7 @@ const Index = () => {
       });
       
       if (response.ok) {
+        rememberWrite(response);
         setNewGroupDialogOpen(false);
         setNewGroupData({ name: '', platform: '', members: '', description: '', link: '' });
         fetchGroups();
@@ -145,6 +147,7 @@ const Index = () => {
       });
       
       if (response.ok) {
+        rememberWrite(response);
         setReviewDialogOpen(false);
         setNewReviewData({ user_name: '', rating: 5, text: '' });
         setSelectedGroupId(null);